@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import os
+import sys
+import tkinter as tk
+
+"""
+Header image assets for nms.py.
+
+Logos are resized and given rounded corners once, and the resulting RGBA PNG
+is kept in CACHE_DIR under a name derived from the source file's hash, the
+target size and the corner radius. Later launches load that PNG straight into
+a Tk PhotoImage without touching PIL, which is only imported when an image
+actually has to be processed.
+
+Logos are looked up next to this file, or next to the executable in a
+PyInstaller build (whose __file__ is a temporary extraction directory). The
+cache lives in the user's cache directory, since the install directory may be
+read-only; when it cannot be written, the processed image is shown from memory.
+"""
+
+logger = logging.getLogger(__name__)
+
+if getattr(sys, "frozen", False):
+    ASSET_DIR = os.path.dirname(os.path.abspath(sys.executable))
+else:
+    ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def user_cache_dir():
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.join(os.path.expanduser("~"), "Library", "Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "nms-ntpc", "asset_cache")
+
+
+CACHE_DIR = user_cache_dir()
+
+
+def asset_path(filename):
+    return os.path.join(ASSET_DIR, filename)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def cache_path(path, size, radius):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    width, height = size
+    return os.path.join(CACHE_DIR, f"{stem}-{file_hash(path)}-{width}x{height}-r{radius}.png")
+
+
+def round_corners(image, radius):
+    # Make the border of the image curved
+    from PIL import Image, ImageDraw
+
+    mask = Image.new("L", image.size, 0)
+    draw = ImageDraw.Draw(mask)
+    draw.rounded_rectangle((0, 0, image.width, image.height), radius, fill=255)
+
+    result = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    result.paste(image, mask=mask)
+    return result
+
+
+def render_asset(path, size, radius):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return round_corners(image.convert("RGBA").resize(size), radius)
+
+
+def save_cached(image, target):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write then rename, so an interrupted launch never leaves a truncated cache entry
+    temporary = f"{target}.{os.getpid()}.tmp"
+    try:
+        image.save(temporary, "PNG")
+        os.replace(temporary, target)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def load_image(master, filename, size, radius=10):
+    # PhotoImage of the processed asset, or None when the source is missing or unreadable
+    path = asset_path(filename)
+    try:
+        target = cache_path(path, size, radius)
+        if os.path.exists(target):
+            return tk.PhotoImage(master=master, file=target)
+        image = render_asset(path, size, radius)
+    except (OSError, ImportError, tk.TclError) as error:
+        logger.warning("Could not load image %s: %s", filename, error)
+        return None
+
+    try:
+        save_cached(image, target)
+        return tk.PhotoImage(master=master, file=target)
+    except (OSError, tk.TclError) as error:
+        # No writable cache: show the image anyway and process it again next launch
+        logger.info("Could not cache image %s: %s", filename, error)
+        from PIL import ImageTk
+
+        return ImageTk.PhotoImage(image, master=master)
@@ -0,0 +1,540 @@
+import bisect
+import math
+import operator
+import tkinter as tk
+from tkinter import ttk
+
+"""
+Row bookkeeping for the device Treeviews in nms.py.
+
+A DeviceTable keeps the devices of one Treeview in display order and stores
+each device's position on the device itself (device.row), so a serial number
+is a field lookup instead of a `tree.index()` scan inside Tk. Positions are
+renumbered only from the first row an insert or removal touches.
+
+Rows are rendered through refresh(), which remembers the last values, tag and
+image sent to Tk for each device (device.rendered) and skips the Tcl call when
+nothing changed. Status tags are configured once, when the table is created.
+
+Each table also indexes its Treeview items (item id -> Device), so checking
+whether a device is on screen, or which device a selected row belongs to,
+never asks Tk for the list of children.
+
+Tables count their devices per status as they are inserted, removed or
+change state (recount), so fleet totals never need a full recount. Each table
+remembers the status it counted for a device, because the monitoring engine
+updates device.status on its own thread before the table hears about it.
+
+set_filter() narrows a table to a set of devices without rebuilding it:
+plain tables detach and reattach Treeview items, virtualized tables just
+render from the filtered list.
+
+Sparkline images are only requested for rows in view. Plain tables work out
+their visible window from tree.yview() once per frame (update_window) and
+refresh the rows that just scrolled in; rows out of view keep the image they
+last showed.
+
+sort_by() orders a table by a column key. Name and IP keys are precomputed on
+the device; status and latency keys change with every probe, so devices are
+queued (queue_resort) and resort() moves only the ones whose key changed,
+once per frame, by bisecting them back into the ordered rows. Equal keys fall
+back to creation order, so rows never swap places without a reason.
+
+VirtualDeviceTable has the same interface for fleets of tens of thousands of
+devices: it keeps the rows in memory and only materializes the visible window.
+"""
+
+STATUS_TAGS = {'green': 'green', 'red': 'red', 'grey': 'grey', 'alarm': 'red'}  # tag -> foreground colour
+STATUSES = ("Online", "Offline", "Unknown")
+STATUS_ORDER = {"Offline": 0, "Unknown": 1, "Online": 2}  # ascending status sort puts outages first
+EXTEND_SELECTION = 0x0001 | 0x0004 | 0x0008  # Shift, Control, Command (macOS) in event.state
+RESORT_FRACTION = 8  # resort() sorts the whole table when more than 1/8 of the rows changed key
+
+
+def measured(value):
+    # Unmeasured latency sorts after every measurement (first when sorting worst first)
+    return float('inf') if value is None else value
+
+
+SORT_KEYS = {
+    'Serial': lambda device: device.sequence,
+    'Name': lambda device: device.name_key,
+    'IP': lambda device: device.ip_key,
+    'Status': lambda device: STATUS_ORDER.get(device.status, 1),
+    'RTT': lambda device: measured(device.rtt_avg),
+    'Jitter': lambda device: measured(device.jitter),
+    'Loss': lambda device: measured(device.loss),
+}
+STATIC_SORTS = ('Serial', 'Name', 'IP')  # keys that never change while a device is listed
+sort_key_of = operator.attrgetter('sort_key')
+
+
+class Descending:
+    # Reverses the comparison of a key, so descending rows can still be bisected
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return isinstance(other, Descending) and self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+class DeviceTable:
+    def __init__(self, name, tree, row_values, row_image=None):
+        self.name = name  # key used in device_data.json, e.g. 'tree1'
+        self.tree = tree
+        self.row_values = row_values  # row_values(device, serial) -> tuple of column values
+        self.row_image = row_image  # row_image(device) -> image for the tree column, or None for no images
+        self.rows = []  # devices in display order; device.row indexes this list
+        self.items = {}  # Treeview item id -> Device shown by that item
+        self.counts = dict.fromkeys(STATUSES, 0)  # devices per status
+        self.by_status = {status: set() for status in STATUSES}  # the devices behind each count
+        self.counted = {}  # device -> status it is counted under
+        self.filter = None  # devices to show, or None for all of them
+        self.view = self.rows  # rows that pass the filter; the rows list itself when there is none
+        self.visible = None  # devices scrolled into view, None until measured (every row counts)
+        self.sort_column = None  # column the rows are sorted by, None for the order devices were added
+        self.sort_reverse = False
+        self.unsorted = set()  # devices whose sort key may have changed since they were placed
+        for tag, colour in STATUS_TAGS.items():
+            self.tree.tag_configure(tag, foreground=colour)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def serial(self, device):
+        return device.row + 1
+
+    def insert(self, device, status=None):
+        # status: what to count the device under, when another table had already counted it
+        device.table = self
+        device.table_name = self.name
+        device.tree = self.tree
+        device.row = self.insert_index(device)
+        self.rows.insert(device.row, device)
+        self.count(device, status)
+        device.rendered = self.render_state(device)
+        values, tags, image = device.rendered
+        device.item = self.tree.insert("", device.row if self.filter is None else tk.END,
+                                       values=values, tags=tags, image=image)
+        self.items[device.item] = device
+        if self.filter is not None:
+            if device not in self.filter:
+                self.tree.detach(device.item)
+            else:
+                self.set_filter(self.filter)  # Tk positions only count attached rows
+        self.renumber(device.row + 1)
+
+    def remove(self, devices):
+        # Any number of devices in one pass: one Tk delete, one renumbering
+        removed = [device for device in devices if device.table is self]
+        if not removed:
+            return
+        first = min(device.row for device in removed)
+        self.tree.delete(*[device.item for device in removed])
+        for device in removed:
+            del self.items[device.item]
+            self.uncount(device)
+        removed_ids = {id(device) for device in removed}
+        self.rows[first:] = [device for device in self.rows[first:] if id(device) not in removed_ids]
+        for device in removed:
+            device.table = None
+            device.row = None
+            device.rendered = None
+        if self.filter is not None:
+            self.view = [device for device in self.view if device.table is self]
+        self.renumber(first)
+
+    def shows(self, device):
+        # True when the device has a Treeview item in this table right now
+        return device.item is not None and self.items.get(device.item) is device
+
+    def count(self, device, status=None):
+        status = status or device.status
+        self.counted[device] = status
+        self.counts[status] += 1
+        self.by_status[status].add(device)
+
+    def uncount(self, device):
+        status = self.counted.pop(device)
+        self.counts[status] -= 1
+        self.by_status[status].discard(device)
+
+    def recount(self, device):
+        # Returns the status the device was counted under when it changed, otherwise None
+        old_status = self.counted.get(device)
+        if old_status is None or old_status == device.status:
+            return None
+        self.uncount(device)
+        self.count(device)
+        return old_status
+
+    def selected_devices(self):
+        return [self.items[item] for item in self.tree.selection()
+                if item in self.items and (self.filter is None or self.items[item] in self.filter)]
+
+    def set_filter(self, matches):
+        # One Tk call: set_children detaches every row left out and reattaches the rest in order
+        self.filter = matches
+        self.view = self.rows if matches is None else [device for device in self.rows if device in matches]
+        self.tree.set_children("", *[device.item for device in self.view])
+
+    def make_key(self, device):
+        # Creation order breaks ties in either direction
+        key = SORT_KEYS[self.sort_column](device)
+        return (Descending(key) if self.sort_reverse else key), device.sequence
+
+    def insert_index(self, device):
+        # The end of the table, or the device's place in the current sort order
+        if self.sort_column is None:
+            return len(self.rows)
+        device.sort_key = self.make_key(device)
+        return bisect.bisect(self.rows, device.sort_key, key=sort_key_of)
+
+    def sort_by(self, column, reverse=False):
+        self.sort_column = column
+        self.sort_reverse = reverse
+        self.unsorted.clear()
+        for device in self.rows:
+            device.sort_key = self.make_key(device)
+        self.rows.sort(key=sort_key_of)
+        self.reorder(0, len(self.rows))
+
+    def queue_resort(self, device):
+        # Called for every probe result; only volatile keys can have moved
+        if self.sort_column is not None and self.sort_column not in STATIC_SORTS:
+            self.unsorted.add(device)
+
+    def resort(self):
+        # Once per frame: reposition the queued devices whose key actually changed
+        if not self.unsorted:
+            return
+        pending, self.unsorted = self.unsorted, set()
+        changed = []
+        for device in pending:
+            if device.table is self:
+                key = self.make_key(device)
+                if key != device.sort_key:
+                    device.sort_key = key
+                    changed.append(device)
+        if not changed:
+            return
+        if len(changed) * RESORT_FRACTION > len(self.rows):
+            # Timsort is close to linear on rows that are still mostly in order
+            self.rows.sort(key=sort_key_of)
+            self.reorder(0, len(self.rows))
+            return
+
+        changed.sort(key=sort_key_of)
+        start = min(device.row for device in changed)
+        stop = max(device.row for device in changed) + 1
+        changed_ids = {id(device) for device in changed}
+        self.rows[:] = [device for device in self.rows if id(device) not in changed_ids]
+        # In key order, each device lands after the previous one, so no insert shifts an earlier one
+        for device in changed:
+            index = bisect.bisect(self.rows, device.sort_key, key=sort_key_of)
+            self.rows.insert(index, device)
+            start = min(start, index)
+            stop = max(stop, index + 1)
+        self.reorder(start, stop, changed)
+
+    def reorder(self, start, stop, moved=None):
+        # Rows start:stop changed places; moved are the only devices that changed relative order
+        self.renumber(start, stop)
+        if self.filter is not None or moved is None:
+            self.set_filter(self.filter)  # one set_children call for the whole new order
+            return
+        # Detached first, the moved rows can go straight to their final positions in row order
+        self.tree.detach(*[device.item for device in moved])
+        for device in moved:
+            self.tree.move(device.item, "", device.row)
+
+    def renumber(self, start=0, stop=None):
+        # Serial numbers below the first changed row are still right
+        stop = len(self.rows) if stop is None else stop
+        for index in range(start, stop):
+            device = self.rows[index]
+            device.row = index
+            self.refresh(device)
+
+    def update_window(self):
+        # Once per frame: find the rows in view, and refresh the ones that just scrolled in
+        if self.row_image is None or not self.tree.winfo_ismapped():
+            return
+        top, bottom = self.tree.yview()
+        count = len(self.view)
+        visible = set(self.view[int(top * count):math.ceil(bottom * count)])
+        appeared = visible if self.visible is None else visible - self.visible
+        self.visible = visible
+        for device in appeared:
+            self.refresh(device)
+
+    def in_view(self, device):
+        return self.visible is None or device in self.visible
+
+    def render_state(self, device):
+        tags = (device.tag,) if device.tag else ()
+        image = ""
+        if self.row_image is not None:
+            if self.in_view(device):
+                image = self.row_image(device)
+            elif device.rendered is not None:
+                image = device.rendered[2]  # no redraw until the row scrolls back into view
+        return self.row_values(device, device.row + 1), tags, image
+
+    def refresh(self, device):
+        # Only talk to Tk when the row would actually look different
+        if not self.shows(device):
+            return
+        state = self.render_state(device)
+        if state == device.rendered:
+            return
+        device.rendered = state
+        values, tags, image = state
+        self.tree.item(device.item, values=values, tags=tags, image=image)
+
+    def refresh_all(self):
+        for device in self.rows:
+            self.refresh(device)
+
+    def clear(self):
+        # Drop every Tk item, e.g. before the rows move to a table of another kind
+        self.tree.delete(*[device.item for device in self.rows])
+        for device in self.rows:
+            device.table = None
+            device.row = None
+            device.item = None
+            device.rendered = None
+        self.rows = []
+        self.items = {}
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.by_status = {status: set() for status in STATUSES}
+        self.counted = {}
+        self.filter = None
+        self.view = self.rows
+        self.visible = None
+        self.unsorted = set()
+
+
+class VirtualDeviceTable(DeviceTable):
+    # Only the rows in view exist as Treeview items. A fixed pool of items ("slots")
+    # is recycled as the user scrolls, so Tk's item count does not grow with the fleet.
+    # device.item is the slot currently showing the device, or None when off screen.
+
+    def __init__(self, name, tree, row_values, row_image=None):
+        super().__init__(name, tree, row_values, row_image)
+        self.offset = 0  # index of the first row in view
+        self.slots = []
+        self.shown = []  # device in each slot, in slot order
+        self.slot_state = {}  # slot -> (values, tags, image) last sent to Tk
+        self.capacity = 1  # rows that fit in the widget
+        self.selected = set()  # selected devices, remembered while scrolled out of view
+        self.render_pending = False
+
+        self.scrollbar = ttk.Scrollbar(tree.master, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.place(in_=tree, relx=1.0, rely=0, relheight=1.0, anchor="ne")
+        self.bindings = [(sequence, tree.bind(sequence, handler, add="+")) for sequence, handler in (
+            ("<Configure>", self.on_resize),
+            ("<MouseWheel>", self.on_wheel),
+            ("<Button-4>", lambda event: self.on_wheel_step(-3)),
+            ("<Button-5>", lambda event: self.on_wheel_step(3)),
+            ("<ButtonPress-1>", self.on_click),
+            ("<<TreeviewSelect>>", self.on_select),
+        )]
+
+    def insert(self, device, status=None):
+        device.table = self
+        device.table_name = self.name
+        device.tree = self.tree
+        device.item = None
+        device.rendered = None
+        device.row = self.insert_index(device)
+        self.rows.insert(device.row, device)
+        for index in range(device.row + 1, len(self.rows)):
+            self.rows[index].row = index
+        self.count(device, status)
+        self.schedule_render()
+
+    def remove(self, devices):
+        removed = [device for device in devices if device.table is self]
+        if not removed:
+            return
+        first = min(device.row for device in removed)
+        removed_ids = {id(device) for device in removed}
+        self.rows[first:] = [device for device in self.rows[first:] if id(device) not in removed_ids]
+        for device in removed:
+            device.table = None
+            device.row = None
+            device.item = None
+            self.selected.discard(device)
+            self.uncount(device)
+        for index in range(first, len(self.rows)):
+            self.rows[index].row = index
+        self.refilter()
+        self.schedule_render()
+
+    def reorder(self, start, stop, moved=None):
+        # Nothing to move in Tk; the next render fills the slots in the new order
+        for index in range(start, stop):
+            self.rows[index].row = index
+        self.refilter()
+        self.schedule_render()
+
+    def update_window(self):
+        pass  # only rows in view have slots, and render() refreshes each slot it fills
+
+    def refresh(self, device):
+        if not self.shows(device):
+            return  # off screen; rendered when it scrolls into view
+        slot = device.item
+        state = self.render_state(device)
+        if state == self.slot_state.get(slot):
+            return
+        self.slot_state[slot] = state
+        values, tags, image = state
+        self.tree.item(slot, values=values, tags=tags, image=image)
+
+    def selected_devices(self):
+        # Includes selected rows that are scrolled out of view, but not filtered out
+        return sorted((device for device in self.selected if self.filter is None or device in self.filter),
+                      key=lambda device: device.row)
+
+    def set_filter(self, matches):
+        self.filter = matches
+        self.offset = 0
+        self.refilter()
+        self.render()
+
+    def refilter(self):
+        if self.filter is None:
+            self.view = self.rows
+        else:
+            self.view = [device for device in self.rows if device in self.filter]
+
+    def refresh_all(self):
+        for slot in self.slots:
+            self.slot_state.pop(slot, None)
+        self.render()
+
+    def clear(self):
+        for sequence, function_id in self.bindings:
+            self.tree.unbind(sequence, function_id)
+        self.scrollbar.destroy()
+        self.tree.delete(*self.slots)
+        for device in self.rows:
+            device.table = None
+            device.row = None
+            device.item = None
+        self.rows = []
+        self.view = self.rows
+        self.slots = []
+        self.shown = []
+        self.items = {}
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.by_status = {status: set() for status in STATUSES}
+        self.counted = {}
+        self.unsorted = set()
+
+    def schedule_render(self):
+        # Many inserts/removes in a row (e.g. loading 50k devices) cost one render
+        if not self.render_pending:
+            self.render_pending = True
+            self.tree.after_idle(self.render)
+
+    def render(self):
+        self.render_pending = False
+        self.offset = max(min(self.offset, len(self.view) - self.capacity), 0)
+        window = self.view[self.offset:self.offset + self.capacity]
+
+        # Grow or shrink the slot pool to the rows actually in view
+        while len(self.slots) < len(window):
+            self.slots.append(self.tree.insert("", tk.END))
+        if len(self.slots) > len(window):
+            extra = self.slots[len(window):]
+            self.tree.delete(*extra)
+            for slot in extra:
+                self.slot_state.pop(slot, None)
+            del self.slots[len(window):]
+
+        for device in self.shown:
+            device.item = None
+        self.shown = window
+        self.items = dict(zip(self.slots, window))
+        for slot, device in zip(self.slots, window):
+            device.item = slot
+            self.refresh(device)
+
+        selected_slots = [device.item for device in window if device in self.selected]
+        self.tree.selection_set(selected_slots)
+
+        if self.view:
+            self.scrollbar.set(self.offset / len(self.view), (self.offset + len(window)) / len(self.view))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll_to(self, offset):
+        offset = max(min(int(offset), len(self.view) - self.capacity), 0)
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.offset + rows)
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * len(self.view))
+        elif unit == "pages":
+            self.scroll_by(int(amount) * self.capacity)
+        else:
+            self.scroll_by(int(amount))
+
+    def on_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small deltas
+        step = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_by(-step * 3)
+        return "break"
+
+    def on_wheel_step(self, rows):
+        # X11 wheel buttons; "break" keeps the Treeview class binding from scrolling the slot pool itself
+        self.scroll_by(rows)
+        return "break"
+
+    def heading_height(self, row_height):
+        # Pixels above the first row; estimated as one row until a slot is on screen to measure
+        if self.slots:
+            box = self.tree.bbox(self.slots[0])
+            if box:
+                return box[1]
+        return row_height if "headings" in str(self.tree.cget("show")) else 0
+
+    def on_resize(self, event):
+        style = ttk.Style()
+        row_height = int(style.lookup(self.tree.cget("style"), "rowheight") or 20)
+        capacity = max((event.height - self.heading_height(row_height)) // row_height, 1)
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self.render()
+
+    def on_click(self, event):
+        # A plain click on a row replaces the selection, including rows scrolled out of view;
+        # Tk's own binding then selects the clicked slot and on_select records it
+        if event.state & EXTEND_SELECTION:
+            return
+        if self.tree.identify_region(event.x, event.y) in ("cell", "tree"):
+            self.selected.intersection_update(self.shown)
+
+    def on_select(self, event):
+        current = set(self.tree.selection())
+        for slot, device in zip(self.slots, self.shown):
+            if slot in current:
+                self.selected.add(device)
+            else:
+                self.selected.discard(device)
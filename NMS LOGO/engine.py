@@ -0,0 +1,357 @@
+import argparse
+import collections
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import socket
+import threading
+import time
+
+from probes import DEFAULT_BACKEND, DEFAULT_TIMEOUT
+from scheduler import ProbeScheduler, SCAN_MODES, DEFAULT_INTERVAL
+from sharding import ShardedScheduler
+from sparkline import SPARKLINE_SAMPLES
+
+"""
+UI-free monitoring engine for nms.py.
+
+MonitorEngine owns the device registry, the probe scheduler, the live state of
+every device and device_data.json. Results are applied to the devices on the
+scheduler's thread as they arrive, so monitoring keeps running at full speed
+however busy (or absent) the UI is. Listeners get every event afterwards; the
+Tk app is one such listener and only renders the state it is told about.
+
+`python nms.py --headless` (or `python engine.py` on machines without tkinter)
+runs the engine alone, logging status changes and a periodic summary, and can
+write a JSON status snapshot for other tools to read.
+"""
+
+logger = logging.getLogger(__name__)
+
+DATA_FILE = "device_data.json"
+STATUSES = ("Online", "Offline", "Unknown")
+ENGINE_SETTINGS = ("scan_mode", "cycle_period", "workers")  # the rest of 'settings' belongs to the UI
+STATUS_INTERVAL = 10.0  # seconds between headless summaries and status snapshots
+NUMBER_SPLIT = re.compile(r"(\d+)")
+SEQUENCE = itertools.count()  # creation order of devices, the table order before any sort
+
+
+def name_key(name):
+    # Natural order: "switch2" before "switch10", case ignored
+    return tuple(int(part) if index % 2 else part
+                 for index, part in enumerate(NUMBER_SPLIT.split(name.casefold())))
+
+
+def ip_key(ip):
+    # Numeric address order; IPv4 before IPv6 before host names
+    ip = ip or ""
+    try:
+        return (0, int.from_bytes(socket.inet_aton(ip), "big"), "")
+    except OSError:
+        pass
+    try:
+        return (1, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big"), "")
+    except OSError:
+        return (2, 0, ip.casefold())
+
+
+class Device:
+    def __init__(self, name, ip, backend=DEFAULT_BACKEND, port=None, interval=DEFAULT_INTERVAL,
+                 timeout=DEFAULT_TIMEOUT, table_name='tree1'):
+        self.name = name
+        self.ip = ip
+        self.backend = backend  # name of the probe backend in probes.BACKENDS
+        self.port = port  # TCP port for the "tcp" backend, None for the default
+        self.interval = interval  # base seconds between probes; the scheduler adapts around it
+        self.timeout = timeout  # seconds to wait for each reply
+        self.table_name = table_name  # table the device is listed in, as saved in device_data.json
+        self.sequence = next(SEQUENCE)
+        # Sort keys that never change, computed once instead of on every sort
+        self.name_key = name_key(name)
+        self.ip_key = ip_key(ip)
+        self.status = "Unknown"
+        self.offline_since = None  # time.time() when the device went offline
+
+        # Latency figures from the last probe, in milliseconds (loss in percent)
+        self.rtt_min = None
+        self.rtt_avg = None
+        self.rtt_max = None
+        self.jitter = None
+        self.loss = None
+        self.rtt_history = collections.deque(maxlen=SPARKLINE_SAMPLES)  # average RTT per probe, None when lost
+        self.samples = 0  # probes recorded so far; tells the sparkline cache its image is stale
+        # (samples, RTTs) snapshot for the Tk thread, which must never iterate the live deque;
+        # replaced under the engine lock, never mutated
+        self.history = (0, ())
+
+        # Display state, only touched by the Tk app (see device_table.py)
+        self.item = None
+        self.tree = None
+        self.table = None  # DeviceTable the device is listed in
+        self.row = None  # position in that table, kept up to date by the table
+        self.sort_key = None  # key the table placed the device by while it is sorted
+        self.tag = None  # status colour tag: 'green', 'red', 'grey' or 'alarm'
+        self.rendered = None  # (values, tags, image) last sent to the Treeview
+        self.alarm = False  # offline for longer than the alarm threshold; its row flashes
+        self.hide_ip = False
+
+    def update_metrics(self, result):
+        self.status = "Online" if result.ok else "Offline"
+        self.rtt_min = result.rtt_min
+        self.rtt_avg = result.rtt
+        self.rtt_max = result.rtt_max
+        self.jitter = result.jitter
+        self.loss = result.loss
+        self.rtt_history.append(result.rtt if result.ok else None)
+        self.samples += 1
+        self.history = (self.samples, tuple(self.rtt_history))
+
+
+class MonitorEngine:
+    def __init__(self, data_file=DATA_FILE):
+        self.data_file = data_file
+        self.devices = {}  # name -> Device; the same dict for the engine's whole life
+        self.lock = threading.Lock()  # guards device state, counts and outages
+        self.scan_mode = "adaptive"
+        self.cycle_period = 5.0
+        self.workers = 0  # probe worker processes, 0 to probe from this process
+        self.settings = {}  # UI settings from device_data.json, kept so saving never drops them
+        self.labels = {}
+        self.counts = dict.fromkeys(STATUSES, 0)  # devices per status
+        self.outages = {}  # offline device -> time it went offline, oldest first
+        self.listeners = []  # called as listener(event) from the scheduler's thread
+        self.running = False
+        self.monitor = self.create_monitor()
+
+    def add_listener(self, listener):
+        # Events: ("result", device, result), ("probe_start", device),
+        # ("sweep", duration, count) and ("overrun", message)
+        self.listeners.append(listener)
+
+    def emit(self, event):
+        for listener in self.listeners:
+            listener(event)
+
+    def create_monitor(self):
+        # Probes run as coroutines on the scheduler's own thread (or in worker processes)
+        callbacks = dict(
+            on_result=self.apply_result,
+            on_probe_start=lambda device: self.emit(("probe_start", device)),
+            on_sweep=lambda duration, count: self.emit(("sweep", duration, count)),
+            on_overrun=lambda message: self.emit(("overrun", message)))
+        if self.workers > 0:
+            return ShardedScheduler(mode=self.scan_mode, cycle_period=self.cycle_period, workers=self.workers,
+                                    **callbacks)
+        return ProbeScheduler(mode=self.scan_mode, cycle_period=self.cycle_period, **callbacks)
+
+    def apply_result(self, device, result):
+        with self.lock:
+            if self.devices.get(device.name) is not device:
+                return  # removed while its probe was in flight
+            old_status = device.status
+            device.update_metrics(result)
+            if device.status != old_status:
+                self.counts[old_status] -= 1
+                self.counts[device.status] += 1
+                # O(1) per transition; outages stay ordered by start time
+                if device.status == "Offline":
+                    device.offline_since = time.time()
+                    self.outages[device] = device.offline_since
+                elif old_status == "Offline":
+                    device.offline_since = None
+                    self.outages.pop(device, None)
+        if device.status != old_status:
+            logger.info("%s (%s) is %s", device.name, device.ip, device.status.lower())
+        self.emit(("result", device, result))
+
+    def start(self):
+        # Starting an already running scheduler is a no-op
+        self.reset_device_cycle()
+        self.monitor.start()
+        self.running = True
+
+    def stop(self):
+        self.monitor.stop()
+        self.running = False
+
+    def reset_device_cycle(self):
+        # Hand the scheduler a fresh snapshot of the devices
+        self.monitor.set_devices(self.devices.values())
+
+    def add_device(self, device):
+        # Returns False, changing nothing, when another device already has the name
+        with self.lock:
+            if device.name in self.devices:
+                return False
+            self.devices[device.name] = device
+            self.counts[device.status] += 1
+        self.reset_device_cycle()
+        return True
+
+    def remove_devices(self, devices):
+        # Any number of devices, one scheduler update
+        with self.lock:
+            devices = [device for device in devices if self.devices.get(device.name) is device]
+            for device in devices:
+                del self.devices[device.name]
+                self.counts[device.status] -= 1
+                self.outages.pop(device, None)
+        if devices:
+            self.reset_device_cycle()
+        return devices
+
+    def update_worker_count(self, workers):
+        if workers == self.workers:
+            return
+        self.monitor.stop()
+        self.workers = workers
+        self.monitor = self.create_monitor()
+        self.monitor.set_devices(self.devices.values())
+        if self.running:
+            self.monitor.start()
+
+    def update_scan_settings(self, scan_mode, cycle_period):
+        self.scan_mode = scan_mode
+        self.cycle_period = cycle_period
+        self.monitor.configure(mode=scan_mode, cycle_period=cycle_period)
+
+    def longest_outage(self):
+        # (device, offline since) of the oldest ongoing outage, or None
+        with self.lock:
+            return next(iter(self.outages.items()), None)
+
+    def summary(self):
+        with self.lock:
+            counts = dict(self.counts)
+        text = f"{counts['Online']} online, {counts['Offline']} offline, {counts['Unknown']} unknown"
+        outage = self.longest_outage()
+        if outage is not None:
+            device, since = outage
+            text += f"; longest outage {device.name} ({time.time() - since:.0f} s)"
+        return text
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'time': time.time(),
+                'counts': dict(self.counts),
+                'devices': {
+                    name: {
+                        'ip': device.ip,
+                        'table': device.table_name,
+                        'status': device.status,
+                        'offline_since': device.offline_since,
+                        'rtt_min': device.rtt_min,
+                        'rtt_avg': device.rtt_avg,
+                        'rtt_max': device.rtt_max,
+                        'jitter': device.jitter,
+                        'loss': device.loss
+                    } for name, device in self.devices.items()
+                }
+            }
+
+    def save(self, settings=None, labels=None):
+        # The UI passes its own settings and labels; headless saves keep the last ones loaded
+        if settings is not None:
+            self.settings = {key: value for key, value in settings.items() if key not in ENGINE_SETTINGS}
+        if labels is not None:
+            self.labels = labels
+        try:
+            device_data = {
+                'devices': {
+                    name: {
+                        'ip': device.ip,
+                        'table': device.table_name,
+                        'backend': device.backend,
+                        'port': device.port,
+                        'interval': device.interval,
+                        'timeout': device.timeout
+                    } for name, device in self.devices.items()
+                },
+                'labels': self.labels,
+                'settings': dict(self.settings, scan_mode=self.scan_mode, cycle_period=self.cycle_period,
+                                 workers=self.workers)
+            }
+
+            with open(self.data_file, 'w') as file:
+                json.dump(device_data, file, indent=4)
+        except Exception as e:
+            logger.error("Error saving devices: %s", e)
+
+    def load(self):
+        # Returns False when there is no data file yet
+        if not os.path.exists(self.data_file):
+            return False
+
+        with open(self.data_file, 'r') as file:
+            loaded_data = json.load(file)
+        self.labels = loaded_data.get('labels', {})
+        settings = loaded_data.get('settings', {})
+        self.settings = {key: value for key, value in settings.items() if key not in ENGINE_SETTINGS}
+
+        scan_mode = settings.get('scan_mode', "adaptive")
+        if scan_mode not in SCAN_MODES:
+            scan_mode = "adaptive"
+        self.update_scan_settings(scan_mode, settings.get('cycle_period', 5.0))
+        self.update_worker_count(settings.get('workers', 0))
+
+        with self.lock:
+            for name, data in loaded_data.get('devices', {}).items():
+                device = Device(name, data.get('ip'), data.get('backend', DEFAULT_BACKEND), data.get('port'),
+                                data.get('interval', DEFAULT_INTERVAL), data.get('timeout', DEFAULT_TIMEOUT),
+                                data.get('table', 'tree1'))
+                self.devices[name] = device
+                self.counts[device.status] += 1
+        return True
+
+
+def write_snapshot(engine, path):
+    # Write then rename, so readers never see a half-written file
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as file:
+        json.dump(engine.snapshot(), file)
+    os.replace(temporary, path)
+
+
+def run_headless(data_file=DATA_FILE, status_file=None, status_interval=STATUS_INTERVAL):
+    engine = MonitorEngine(data_file)
+    if not engine.load():
+        logger.warning("%s not found; add devices from the UI first", data_file)
+    stopping = threading.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: stopping.set())
+
+    engine.start()
+    logger.info("Monitoring %d devices headless", len(engine.devices))
+    try:
+        while not stopping.wait(status_interval):
+            logger.info("Fleet: %s", engine.summary())
+            if status_file:
+                write_snapshot(engine, status_file)
+    finally:
+        engine.stop()
+
+
+def add_arguments(parser):
+    parser.add_argument("--headless", action="store_true", help="monitor without a window")
+    parser.add_argument("--data-file", default=DATA_FILE, help="device list and settings (default: %(default)s)")
+    parser.add_argument("--status-file", help="headless: write a JSON status snapshot here")
+    parser.add_argument("--status-interval", type=float, default=STATUS_INTERVAL,
+                        help="headless: seconds between summaries and snapshots (default: %(default)s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the NMS monitoring engine without a UI")
+    add_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    run_headless(args.data_file, args.status_file, args.status_interval)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,79 @@
+import tkinter.font as tkFont
+from tkinter import ttk
+
+"""
+Named fonts for nms.py.
+
+Every configurable widget uses one named tkFont.Font, created once. Changing a
+font reconfigures that Font object in place and Tk redraws every widget using
+it on its next idle pass, so nothing has to walk the widget tree or pump the
+event loop. Each table gets its own ttk style derived from the shared table
+style, so fonts and row heights of one table never leak into the other.
+"""
+
+DEFAULT_FAMILY = "Helvetica"
+ROW_PADDING = 10  # pixels added to a table font's line height for its row height
+
+
+def parse_style(font_style):
+    # "bold italic underline" -> Font options
+    words = font_style.split() if font_style else []
+    return {
+        'weight': 'bold' if 'bold' in words else 'normal',
+        'slant': 'italic' if 'italic' in words else 'roman',
+        'underline': 'underline' in words,
+    }
+
+
+class FontManager:
+    def __init__(self, root, text_size, family=DEFAULT_FAMILY):
+        self.style = ttk.Style(root)
+        # Keyed like the "Select Widget" choices in the settings dialog
+        self.fonts = {
+            'title_label': tkFont.Font(root, name="nmsTitle", family=family, size=24, weight='bold'),
+            'label_tree1': tkFont.Font(root, name="nmsLabel1", family=family, size=22, weight='bold'),
+            'label_tree2': tkFont.Font(root, name="nmsLabel2", family=family, size=22, weight='bold'),
+            'tree1': tkFont.Font(root, name="nmsTable1", family=family, size=text_size),
+            'tree2': tkFont.Font(root, name="nmsTable2", family=family, size=text_size),
+        }
+        self.table_styles = {}  # table widget name -> ttk style name
+        self.root = root
+        self.families = None  # sorted font families, enumerated once on first use
+
+    def family_list(self):
+        # Enumerating the system fonts can take seconds, so it happens once per run;
+        # the app asks for it from an idle callback right after startup
+        if self.families is None:
+            self.families = sorted(set(tkFont.families(self.root)))
+        return self.families
+
+    def font(self, widget_name):
+        return self.fonts[widget_name]
+
+    def table_style(self, widget_name, base_style):
+        # Derived style, e.g. "tree1.rounded_treeview_10", inheriting layout and options from base_style
+        style_name = f"{widget_name}.{base_style}"
+        self.table_styles[widget_name] = style_name
+        self.style.configure(style_name, font=self.fonts[widget_name])
+        self.update_row_height(widget_name)
+        return style_name
+
+    def set_font(self, widget_name, family=None, size=None, font_style=None):
+        options = {}
+        if family:
+            options['family'] = family
+        if size:
+            options['size'] = int(size)
+        if font_style is not None:
+            options.update(parse_style(font_style))
+        self.fonts[widget_name].configure(**options)
+        if widget_name in self.table_styles:
+            self.update_row_height(widget_name)
+
+    def set_table_size(self, size):
+        for widget_name in self.table_styles:
+            self.set_font(widget_name, size=size)
+
+    def update_row_height(self, widget_name):
+        linespace = self.fonts[widget_name].metrics("linespace")
+        self.style.configure(self.table_styles[widget_name], rowheight=linespace + ROW_PADDING)
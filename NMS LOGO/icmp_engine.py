@@ -0,0 +1,287 @@
+import asyncio
+import collections
+import ctypes
+import errno
+import os
+import platform
+import socket
+import struct
+import select
+import threading
+import time
+import random
+
+"""
+Built-in ICMP echo engine used by nms.py instead of forking `ping` per probe.
+
+One socket (raw, or the Linux unprivileged SOCK_DGRAM ICMP socket) carries every
+echo request. Replies are matched back to their request by identifier/sequence
+on a single receiver thread, so any number of probes can be in flight at once.
+Round-trip times are reported in milliseconds, None meaning no reply in time.
+
+The kernel hands a copy of every ICMP packet the host receives to every raw
+socket. On Linux each raw socket therefore gets a BPF filter that only lets
+replies carrying its own identifier through, so several engines (one per
+probe worker process) do not each parse every other engine's replies. Worker
+processes also prefer the datagram socket, where the kernel does that
+demultiplexing itself; see prefer_datagram().
+"""
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+PAYLOAD = b"NMS-NTPC".ljust(56, b".")
+POLL_INTERVAL = 0.05
+RECEIVE_BUFFER = 4 * 1024 * 1024
+SEND_BUFFER = 4 * 1024 * 1024
+# Requests to unresolved LAN neighbours sit in the kernel until ARP gives up,
+# so a wave of dead hosts can fill the send buffer; those sends are retried
+RETRY_ERRNOS = (errno.ENOBUFS, errno.EAGAIN, errno.EWOULDBLOCK)
+SO_ATTACH_FILTER = getattr(socket, "SO_ATTACH_FILTER", 26)  # Linux only; not exported by every Python
+
+
+def checksum(data):
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack("!%dH" % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier, sequence):
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    packet_checksum = checksum(header + PAYLOAD)
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, packet_checksum, identifier, sequence)
+    return header + PAYLOAD
+
+
+def open_icmp_socket(datagram_first=False):
+    # Prefer a raw socket; fall back to the unprivileged datagram socket Linux
+    # offers when net.ipv4.ping_group_range allows it. Worker processes try the
+    # datagram socket first, since the kernel only delivers them their own replies.
+    if datagram_first:
+        try:
+            return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+        except OSError:
+            pass
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+    except (PermissionError, OSError):
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+
+
+def attach_identifier_filter(sock, identifier):
+    # Classic BPF for a raw ICMP socket: skip the IPv4 header, keep the packet only when
+    # the ICMP identifier is ours. Best effort; without it replies are filtered in Python.
+    program = [
+        (0xb1, 0, 0, 0),  # ldxb 4*([0]&0xf)     X = IPv4 header length
+        (0x48, 0, 0, 4),  # ldh [x + 4]          A = ICMP identifier
+        (0x15, 0, 1, identifier),  # jeq #identifier, accept, drop
+        (0x06, 0, 0, 0xFFFF),  # ret #65535        accept
+        (0x06, 0, 0, 0),  # ret #0               drop
+    ]
+    instructions = b"".join(struct.pack("HBBI", *instruction) for instruction in program)
+    buffer = ctypes.create_string_buffer(instructions)
+    program_header = struct.pack("HL", len(program), ctypes.addressof(buffer))
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, program_header)
+    except OSError:
+        return False
+    return True
+
+
+async def resolve_async(host):
+    # IPv4 address for host; name lookups run on the loop's resolver instead of blocking the loop
+    try:
+        socket.inet_aton(host)
+        return host
+    except OSError:
+        pass
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    return infos[0][4][0]
+
+
+class PendingEcho:
+    __slots__ = ("address", "sent_at", "deadline", "callback")
+
+    def __init__(self, address, sent_at, deadline, callback):
+        self.address = address
+        self.sent_at = sent_at
+        self.deadline = deadline
+        self.callback = callback
+
+
+class IcmpEngine:
+    def __init__(self, timeout=1.0, datagram_first=False):
+        self.timeout = timeout
+        self.sock, self.raw = open_icmp_socket(datagram_first)
+        self.sock.setblocking(False)
+        try:
+            # Large bursts of requests and replies must not overflow the default buffers
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        except OSError:
+            pass
+        self.identifier = os.getpid() & 0xFFFF
+        if self.raw and platform.system() == "Linux":
+            attach_identifier_filter(self.sock, self.identifier)
+        self.sequence = random.randint(0, 0xFFFF)
+        self.pending = {}  # sequence -> PendingEcho
+        self.backlog = collections.deque()  # sequences whose send hit a full buffer
+        self.lock = threading.Lock()
+        self.running = True
+        self.receiver = threading.Thread(target=self.receive_loop, name="icmp-receiver", daemon=True)
+        self.receiver.start()
+
+    def next_sequence(self):
+        # Called with the lock held; skip sequences still waiting for a reply
+        for _ in range(0x10000):
+            self.sequence = (self.sequence + 1) & 0xFFFF
+            if self.sequence not in self.pending:
+                return self.sequence
+        raise RuntimeError("Too many ICMP echo requests in flight")
+
+    def submit(self, address, callback, timeout=None):
+        # Send one echo request to an IPv4 address (see resolve_async); callback(rtt_ms or None)
+        # runs on the receiver thread
+        timeout = self.timeout if timeout is None else timeout
+        with self.lock:
+            sequence = self.next_sequence()
+            sent_at = time.perf_counter()
+            self.pending[sequence] = PendingEcho(address, sent_at, sent_at + timeout, callback)
+            try:
+                self.sock.sendto(build_echo_request(self.identifier, sequence), (address, 0))
+                sent_failed = False
+            except OSError as error:
+                sent_failed = error.errno not in RETRY_ERRNOS
+                if sent_failed:
+                    del self.pending[sequence]
+                else:
+                    self.backlog.append(sequence)
+
+        if sent_failed:
+            callback(None)
+
+    async def ping_async(self, host, timeout=None):
+        # Await a reply from inside an asyncio loop without tying up a thread
+        try:
+            address = await resolve_async(host)
+        except OSError:
+            return None
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve_future(rtt):
+            if not future.done():
+                future.set_result(rtt)
+
+        def on_reply(rtt):
+            try:
+                loop.call_soon_threadsafe(resolve_future, rtt)
+            except RuntimeError:
+                pass  # the loop was closed while the echo was in flight
+
+        self.submit(address, on_reply, timeout)
+        return await future
+
+    def receive_loop(self):
+        while self.running:
+            try:
+                readable, _, _ = select.select([self.sock], [], [], POLL_INTERVAL)
+            except (OSError, ValueError):
+                break
+            if readable:
+                self.drain_replies()
+            self.flush_backlog()
+            self.expire_pending()
+
+    def flush_backlog(self):
+        with self.lock:
+            while self.backlog:
+                sequence = self.backlog[0]
+                echo = self.pending.get(sequence)
+                if echo is not None:
+                    try:
+                        self.sock.sendto(build_echo_request(self.identifier, sequence), (echo.address, 0))
+                    except OSError as error:
+                        if error.errno in RETRY_ERRNOS:
+                            return  # still full, try again on the next pass
+                    echo.sent_at = time.perf_counter()
+                self.backlog.popleft()
+
+    def drain_replies(self):
+        while True:
+            try:
+                packet, (address, _) = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            received_at = time.perf_counter()
+
+            if self.raw:
+                # Raw sockets hand us the IPv4 header as well
+                header_length = (packet[0] & 0x0F) * 4
+                packet = packet[header_length:]
+            if len(packet) < 8:
+                continue
+            icmp_type, _, _, identifier, sequence = struct.unpack("!BBHHH", packet[:8])
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            # The kernel rewrites the identifier on datagram sockets and only
+            # delivers our own replies, so the identifier is checked for raw only
+            if self.raw and identifier != self.identifier:
+                continue
+
+            with self.lock:
+                echo = self.pending.get(sequence)
+                if echo is None or echo.address != address:
+                    continue
+                del self.pending[sequence]
+            echo.callback((received_at - echo.sent_at) * 1000.0)
+
+    def expire_pending(self):
+        now = time.perf_counter()
+        expired = []
+        with self.lock:
+            for sequence, echo in list(self.pending.items()):
+                if echo.deadline <= now:
+                    expired.append(echo)
+                    del self.pending[sequence]
+        for echo in expired:
+            echo.callback(None)
+
+    def close(self):
+        self.running = False
+        self.receiver.join(timeout=1)
+        self.sock.close()
+        with self.lock:
+            expired = list(self.pending.values())
+            self.pending.clear()
+        for echo in expired:
+            echo.callback(None)
+
+
+_engine = None
+_engine_failed = False
+_engine_lock = threading.Lock()
+_datagram_first = False
+
+
+def prefer_datagram():
+    # Called by probe worker processes before their first probe
+    global _datagram_first
+    _datagram_first = True
+
+
+def get_icmp_engine():
+    # Shared engine for the process, or None when ICMP sockets are not permitted
+    global _engine, _engine_failed
+    with _engine_lock:
+        if _engine is None and not _engine_failed:
+            try:
+                _engine = IcmpEngine(datagram_first=_datagram_first)
+            except OSError:
+                _engine_failed = True
+        return _engine
@@ -1,16 +1,23 @@
 #quicksave
+import argparse
 import tkinter as tk
 from tkinter import ttk
-import tkinter.font as tkFont
-import subprocess
-import platform
 import json
 import os
-from itertools import cycle
-from concurrent.futures import ThreadPoolExecutor
-from PIL import Image, ImageTk , ImageFilter , ImageDraw
 import base64
+import logging
+import multiprocessing
+import queue
+import time
 import tkinter.messagebox as messagebox
+from scheduler import SCAN_MODES, DEFAULT_INTERVAL, REPORT_PERIOD
+from engine import Device, MonitorEngine, STATUSES, add_arguments, run_headless
+from device_table import DeviceTable, VirtualDeviceTable
+from probes import BACKENDS, DEFAULT_BACKEND, DEFAULT_TIMEOUT
+from sparkline import SparklineCache, SPARKLINE_SIZE
+from fonts import FontManager
+from assets import load_image
+from search import SearchIndex
 
 """
 Author: vanshksingh
@@ -20,7 +27,7 @@ Date: Friday 15/12/2023
 Description: Network Monitoring Using Ping for NTPC requirement
 """
 
-
+logger = logging.getLogger(__name__)
 
 
 def encrypt_password(password):
@@ -82,19 +89,39 @@ class ChangePasswordDialog(tk.Toplevel):
             tk.messagebox.showerror("Error", "Incorrect Current Password")
 
 
-class Device:
-    def __init__(self, name, ip):
-        self.name = name
-        self.ip = ip
-        self.item = None
-        self.tree = None
-        self.status = "Unknown"
-        self.hide_ip = False
+# Treeview columns -> heading text, in display order
+COLUMN_HEADINGS = {
+    "Serial": "Serial No",
+    "Name": "Name",
+    "IP": "IP",
+    "Status": "Status",
+    "RTT": "RTT min/avg/max (ms)",
+    "Jitter": "Jitter (ms)",
+    "Loss": "Loss",
+}
+FIRST_PAINT_DELAY = 200  # ms after the window is mapped before slow startup work runs
+FRAME_INTERVAL = 100  # ms between drains of the result queue
+FRAME_BUDGET = 0.03  # seconds of each frame spent applying results
+
+
+SUMMARY_REFRESH = 1.0  # seconds between summary repaints while an outage clock is running
+BLINK_INTERVAL = 500  # ms between flips of the alarm tag's colours
+ALARM_AFTER = 120.0  # seconds offline before a device's row starts flashing
+ALARM_COLOURS = {True: ('white', 'red'), False: ('red', '')}  # blink phase -> (foreground, background)
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
 
-def ping(host):
-    param = '-n' if platform.system().lower() == 'windows' else '-c'
-    command = ['ping', param, '1', host]
-    return subprocess.call(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
 
 class SettingsDialog(tk.Toplevel):
     def __init__(self, master, app_instance):  # Accept the app_instance argument
@@ -102,6 +129,9 @@ class SettingsDialog(tk.Toplevel):
         self.app_instance = app_instance  # Store the reference to the app instance
         self.title("Settings")
         self.geometry("210x900")
+        # Built once and hidden on close; the app shows it again with load_values()
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
+        self.font_families_loaded = False
 
         # Initialize selected_tree_var
         self.selected_tree_var = tk.StringVar(value='tree1')
@@ -128,7 +158,6 @@ class SettingsDialog(tk.Toplevel):
         tk.Label(self.scrollable_frame, text="Application Title:").pack(pady=5)
         self.title_entry = tk.Entry(self.scrollable_frame)
         self.title_entry.pack(pady=5)
-        self.title_entry.insert(0, self.master.title_text)  # Load current title
 
         # Add setting fields (organized one below the other)
         self.add_setting_fields()
@@ -140,18 +169,45 @@ class SettingsDialog(tk.Toplevel):
         tk.Button(self.scrollable_frame, text="Apply", command=self.apply_settings).pack(pady=10)
         tk.Button(self.scrollable_frame, text="Change Password", command=self.master.change_password).pack(pady=10)
 
+        self.load_values()
+
+    def load_values(self):
+        # Fill every field from the app's current state
+        self.fill(self.title_entry, self.master.title_text)
+        self.fill(self.resolution_entry, self.master.geometry())
+        self.fill(self.text_size_entry, self.master.text_size)
+        self.fill(self.label_table1_entry, self.master.label_tree1.cget("text"))
+        self.fill(self.label_table2_entry, self.master.label_tree2.cget("text"))
+        self.fill(self.cycle_period_entry, self.master.engine.cycle_period)
+        self.fill(self.workers_entry, self.master.engine.workers)
+        self.fill(self.alarm_after_entry, self.master.alarm_after)
+        self.hide_ip_var.set(self.master.hide_ip)
+        self.scan_mode_var.set(self.master.engine.scan_mode)
+        self.virtual_tables_var.set(self.master.virtual_tables)
+        self.sparklines_var.set(self.master.show_sparklines)
+
+        if not self.font_families_loaded:
+            self.font_dropdown['values'] = self.master.fonts.family_list()
+            self.font_families_loaded = True
+        self.font_dropdown.set(self.master.font_family)  # Set current font
+        self.bold_var.set(self.master.font_bold)
+        self.italic_var.set(self.master.font_italic)
+        self.underline_var.set(self.master.font_underline)
+
+    def fill(self, entry, value):
+        entry.delete(0, tk.END)
+        entry.insert(0, value)
+
     def add_setting_fields(self):
         # Resolution setting
         tk.Label(self.scrollable_frame, text="Resolution (e.g., 1920x1080):").pack(pady=5)
         self.resolution_entry = tk.Entry(self.scrollable_frame)
         self.resolution_entry.pack(pady=5)
-        self.resolution_entry.insert(0, self.master.geometry())
 
         # Text size setting
         tk.Label(self.scrollable_frame, text="Text Size (e.g., 12):").pack(pady=5)
         self.text_size_entry = tk.Entry(self.scrollable_frame)
         self.text_size_entry.pack(pady=5)
-        self.text_size_entry.insert(0, self.master.text_size)
 
         self.create_font_settings()
 
@@ -159,18 +215,47 @@ class SettingsDialog(tk.Toplevel):
         tk.Label(self.scrollable_frame, text="Label for Table 1:").pack(pady=5)
         self.label_table1_entry = tk.Entry(self.scrollable_frame)
         self.label_table1_entry.pack(pady=5)
-        self.label_table1_entry.insert(0, self.master.label_tree1.cget("text"))
 
         # Label for Table 2 setting
         tk.Label(self.scrollable_frame, text="Label for Table 2:").pack(pady=5)
         self.label_table2_entry = tk.Entry(self.scrollable_frame)
         self.label_table2_entry.pack(pady=5)
-        self.label_table2_entry.insert(0, self.master.label_tree2.cget("text"))
 
         # Hide IP Addresses checkbox
-        self.hide_ip_var = tk.BooleanVar(value=self.master.hide_ip)
+        self.hide_ip_var = tk.BooleanVar()
         tk.Checkbutton(self.scrollable_frame, text="Hide IP Addresses", variable=self.hide_ip_var).pack(pady=10)
 
+        # Scan mode, and how often a full sweep of every device starts in sweep mode
+        tk.Label(self.scrollable_frame, text="Scan Mode:").pack(pady=5)
+        self.scan_mode_var = tk.StringVar()
+        scan_mode_dropdown = ttk.Combobox(self.scrollable_frame, textvariable=self.scan_mode_var, state="readonly")
+        scan_mode_dropdown['values'] = SCAN_MODES
+        scan_mode_dropdown.pack(pady=5)
+
+        tk.Label(self.scrollable_frame, text="Sweep Cycle Period (seconds):").pack(pady=5)
+        self.cycle_period_entry = tk.Entry(self.scrollable_frame)
+        self.cycle_period_entry.pack(pady=5)
+
+        # Split probing across processes for very large fleets; 0 keeps it in this process
+        tk.Label(self.scrollable_frame, text="Worker Processes (0 = off):").pack(pady=5)
+        self.workers_entry = tk.Entry(self.scrollable_frame)
+        self.workers_entry.pack(pady=5)
+
+        # Rows of devices offline for longer than this start to flash
+        tk.Label(self.scrollable_frame, text="Flash Offline After (seconds):").pack(pady=5)
+        self.alarm_after_entry = tk.Entry(self.scrollable_frame)
+        self.alarm_after_entry.pack(pady=5)
+
+        # Only materialize the rows in view; for fleets of tens of thousands of devices
+        self.virtual_tables_var = tk.BooleanVar()
+        tk.Checkbutton(self.scrollable_frame, text="Virtualized Tables (large fleets)",
+                       variable=self.virtual_tables_var).pack(pady=10)
+
+        # Latency trend of the last probes in a column of small images
+        self.sparklines_var = tk.BooleanVar()
+        tk.Checkbutton(self.scrollable_frame, text="Show RTT Sparklines",
+                       variable=self.sparklines_var).pack(pady=10)
+
     def create_font_settings(self):
         # Widget selection dropdown
         tk.Label(self.scrollable_frame, text="Select Widget:").pack(pady=5)
@@ -189,14 +274,12 @@ class SettingsDialog(tk.Toplevel):
         tk.Label(self.scrollable_frame, text="Font:").pack(pady=5)
         self.font_var = tk.StringVar()
         self.font_dropdown = ttk.Combobox(self.scrollable_frame, textvariable=self.font_var, state="readonly")
-        self.font_dropdown['values'] = list(tkFont.families())
-        self.font_dropdown.pack(pady=5)
-        self.font_dropdown.set(self.app_instance.font_family)  # Set current font
+        self.font_dropdown.pack(pady=5)  # families are filled in by load_values
 
         # Font style (bold, italic, underline)
-        self.bold_var = tk.BooleanVar(value=self.app_instance.font_bold)
-        self.italic_var = tk.BooleanVar(value=self.app_instance.font_italic)
-        self.underline_var = tk.BooleanVar(value=self.app_instance.font_underline)
+        self.bold_var = tk.BooleanVar()
+        self.italic_var = tk.BooleanVar()
+        self.underline_var = tk.BooleanVar()
 
         tk.Checkbutton(self.scrollable_frame, text="Bold", variable=self.bold_var).pack(pady=2)
         tk.Checkbutton(self.scrollable_frame, text="Italic", variable=self.italic_var).pack(pady=2)
@@ -214,6 +297,27 @@ class SettingsDialog(tk.Toplevel):
         self.ip_entry = tk.Entry(self.entry_frame, width=15)
         self.ip_entry.grid(row=0, column=1, padx=5)
 
+        # Probe backend used for the device being added
+        self.backend_var = tk.StringVar(value=DEFAULT_BACKEND)
+        backend_dropdown = ttk.Combobox(self.entry_frame, textvariable=self.backend_var, state="readonly", width=12)
+        backend_dropdown['values'] = [name for name, backend in BACKENDS.items() if backend.available()]
+        backend_dropdown.grid(row=3, column=0, pady=5)
+
+        # Port for TCP-connect probes, left empty for the default
+        self.port_entry = tk.Entry(self.entry_frame, width=15)
+        self.port_entry.grid(row=3, column=1, padx=5)
+
+        # Base probe interval in seconds, e.g. short for core switches, long for printers
+        tk.Label(self.entry_frame, text="Interval (s):").grid(row=4, column=0)
+        self.interval_entry = tk.Entry(self.entry_frame, width=15)
+        self.interval_entry.grid(row=4, column=1, padx=5)
+        self.interval_entry.insert(0, DEFAULT_INTERVAL)
+
+        tk.Label(self.entry_frame, text="Timeout (s):").grid(row=5, column=0)
+        self.timeout_entry = tk.Entry(self.entry_frame, width=15)
+        self.timeout_entry.grid(row=5, column=1, padx=5)
+        self.timeout_entry.insert(0, DEFAULT_TIMEOUT)
+
         add_button = tk.Button(self.entry_frame, text="Add Device", command=self.add_device)
         add_button.grid(row=1, column=0, padx=5)
 
@@ -230,68 +334,54 @@ class SettingsDialog(tk.Toplevel):
         name = self.name_entry.get()
         ip = self.ip_entry.get()
         if name and ip:
-            selected_tree = self.app_instance.tree1 if self.selected_tree_var.get() == 'tree1' else self.app_instance.tree2
-            device = Device(name, ip)
-            device.item = selected_tree.insert("", tk.END,
-                                               values=(len(self.app_instance.devices) + 1, name, ip, "Unknown"))
-            device.tree = selected_tree
-            self.app_instance.devices[name] = device
+            port = self.port_entry.get().strip()
+            if port and not (port.isdigit() and 1 <= int(port) <= 65535):
+                tk.messagebox.showerror("Error", "Port must be a number from 1 to 65535", parent=self)
+                return
+            interval = self.read_seconds(self.interval_entry, DEFAULT_INTERVAL, "Interval")
+            timeout = self.read_seconds(self.timeout_entry, DEFAULT_TIMEOUT, "Timeout")
+            if interval is None or timeout is None:
+                return
+            device = Device(name, ip, self.backend_var.get(), int(port) if port else None, interval, timeout)
+            if not self.app_instance.register_device(device, self.selected_tree_var.get(), parent=self):
+                return
             self.name_entry.delete(0, tk.END)
             self.ip_entry.delete(0, tk.END)
+            self.port_entry.delete(0, tk.END)
             self.app_instance.save_devices()
-            self.app_instance.reset_device_cycle()
 
             # Start monitoring when the first device is added
             if len(self.app_instance.devices) == 1:
                 self.app_instance.monitor_devices()
 
-    def remove_selected(self):
-        # Logic to remove a selected device
-        selected_item = self.master.tree1.selection()
-        if selected_item:
-            device_to_remove = None
-            for name, device in self.master.devices.items():
-                if device.item == selected_item[0]:
-                    self.master.tree1.delete(selected_item[0])
-                    device_to_remove = name
-                    break
-
-            if device_to_remove:
-                del self.master.devices[device_to_remove]
-                self.master.save_devices()
-                self.master.reset_device_cycle()
-            return
+    def read_seconds(self, entry, default, label):
+        # A positive number of seconds, the default when empty, or None after telling the user
+        text = entry.get().strip()
+        if not text:
+            return default
+        try:
+            seconds = float(text)
+        except ValueError:
+            seconds = 0.0
+        if not 0 < seconds < float('inf'):
+            tk.messagebox.showerror("Error", f"{label} must be a positive number of seconds", parent=self)
+            return None
+        return seconds
 
-        selected_item = self.master.tree2.selection()
-        if selected_item:
-            device_to_remove = None
-            for name, device in self.master.devices.items():
-                if device.item == selected_item[0]:
-                    self.master.tree2.delete(selected_item[0])
-                    device_to_remove = name
-                    break
-
-            if device_to_remove:
-                del self.master.devices[device_to_remove]
-                self.master.save_devices()
-                self.master.reset_device_cycle()
-            return
+    def remove_selected(self):
+        # Logic to remove the selected devices
+        self.master.remove_selected()
 
     def apply_settings(self):
         # Logic to apply settings
-
-        # Update IP visibility for each device
-        for device in self.master.devices.values():
-            if self.master.hide_ip:
-                ip_text = '*******'
-            else:
-                ip_text = device.ip
-            device.tree.item(device.item,
-                             values=(device.tree.index(device.item) + 1, device.name, ip_text, device.status))
-
         resolution = self.resolution_entry.get()
         text_size = int(self.text_size_entry.get())
         self.master.update_settings(resolution, text_size, self.hide_ip_var.get())
+        self.master.engine.update_scan_settings(self.scan_mode_var.get(), float(self.cycle_period_entry.get()))
+        self.master.engine.update_worker_count(int(self.workers_entry.get() or 0))
+        self.master.update_table_mode(self.virtual_tables_var.get())
+        self.master.update_sparklines(self.sparklines_var.get())
+        self.master.alarm_after = float(self.alarm_after_entry.get() or ALARM_AFTER)
 
         new_title = self.title_entry.get()
         self.master.update_title(new_title)  # Update the title immediately
@@ -302,9 +392,6 @@ class SettingsDialog(tk.Toplevel):
         self.master.update_ip_visibility()
         self.master.save_devices()
 
-        self.master.text_size = text_size
-        self.master.update_treeview_style()
-
         self.master.text_size = text_size
         self.master.update_treeview_row_height()
 
@@ -316,6 +403,8 @@ class SettingsDialog(tk.Toplevel):
 
         # Update font for the selected widget with font size
         selected_widget = self.widget_var.get()
+        if not selected_widget:
+            return
         font_family = self.font_var.get()
         font_size = self.font_size_var.get()
         font_style = "bold" if self.bold_var.get() else "normal"
@@ -329,7 +418,8 @@ class SettingsDialog(tk.Toplevel):
 
 
 class DeviceMonitorApp(tk.Tk):
-    def __init__(self, resolution='1200x700', text_size=15, hide_ip=False, title_text="Device Monitor Application"):
+    def __init__(self, resolution='1200x700', text_size=15, hide_ip=False, title_text="Device Monitor Application",
+                 data_file="device_data.json"):
         super().__init__()
         self.title("Device Monitor")
 
@@ -343,10 +433,26 @@ class DeviceMonitorApp(tk.Tk):
         self.geometry(resolution)
         self.text_size = text_size
         self.hide_ip = hide_ip
-        self.devices = {}
-        self.device_cycle = cycle([])
-        self.data_file = "device_data.json"
-        self.thread_pool = ThreadPoolExecutor(max_workers=10)
+        self.virtual_tables = False  # tables keep only the visible rows as Treeview items
+        self.show_sparklines = False
+        self.sparklines = SparklineCache()
+        self.summary_dirty = True
+        self.summary_updated = 0.0
+        self.alarm_after = ALARM_AFTER
+        self.alarm_queue = {}  # offline devices not flashing yet -> time they went offline, oldest first
+        self.alarm_count = 0  # devices whose rows are flashing
+        self.blink_on = False
+        self.overrun_timer = None  # after() id that clears the "Falling behind" message
+        self.search = SearchIndex()  # device names and IPs, for the filter box
+        self.filter_pending = False
+        self.filter_statuses = set()  # statuses the current filter words match; their changes re-filter
+        self.data_file = data_file
+        # Devices, probing and persistence live in the engine, which keeps monitoring whatever the UI
+        # is doing; its events are queued here and process_results renders them on the Tk thread
+        self.engine = MonitorEngine(self.data_file)
+        self.devices = self.engine.devices
+        self.result_queue = queue.Queue()
+        self.engine.add_listener(self.result_queue.put)
 
         self.title_text = title_text  # Correctly store the title text
 
@@ -357,6 +463,8 @@ class DeviceMonitorApp(tk.Tk):
         self.font_bold = False
         self.font_italic = False
         self.font_underline = False
+        # Named fonts shared by the widgets; font changes reconfigure these in place
+        self.fonts = FontManager(self, self.text_size, self.font_family)
 
         self.password_file = "password.json"
         self.password = self.load_password()
@@ -364,11 +472,28 @@ class DeviceMonitorApp(tk.Tk):
         self.setup_ui()
         self.load_devices()
         self.reset_device_cycle()
+        self.process_results()
         self.apply_text_size()  # Apply the initial text size
 
         self.widget_fonts = {}
         self.load_font_settings()
 
+        self.settings_dialog = None
+        self.blink()
+        # Slow startup work waits until the window has been mapped and painted (on_first_map):
+        # the header logos, which may need PIL on a cache miss, then the system font list,
+        # which is gathered then rather than when Settings is opened.
+        self.startup_tasks = [self.load_logos, self.fonts.family_list]
+        self.map_binding = self.bind("<Map>", self.on_first_map, add="+")
+
+    def on_first_map(self, event):
+        # <Map> on the root also fires for every child widget; only the window itself counts
+        if event.widget is not self:
+            return
+        self.unbind("<Map>", self.map_binding)
+        for task in self.startup_tasks:
+            self.after(FIRST_PAINT_DELAY, task)
+
     def load_password(self):
         if os.path.exists(self.password_file):
             with open(self.password_file, 'r') as file:
@@ -381,29 +506,13 @@ class DeviceMonitorApp(tk.Tk):
         with open(self.password_file, 'w') as file:
             json.dump({'password': self.password}, file, indent=4)
 
-    def open_settings(self):
-        # Open Password Dialog first. If the password is correct, open_settings_dialog will be called.
-        PasswordDialog(self, self.open_settings_dialog)
-
-    def open_settings_dialog(self):
-        # Open Settings Dialog only after successful password entry
-        SettingsDialog(self, self)
-
     def change_password(self):
         ChangePasswordDialog(self)
 
 
     def update_treeview_row_height(self):
-        # Estimate row height based on font size. Adjust the multiplier as needed.
-        estimated_row_height = self.text_size + 10
-
-        # Configure the custom Treeview style with the new row height
-        style = ttk.Style()
-        style.configure("Custom.Treeview", font=("Helvetica", self.text_size), rowheight=estimated_row_height)
-
-        # Update the style of both treeviews
-        self.tree1.configure(style="Custom.Treeview")
-        self.tree2.configure(style="Custom.Treeview")
+        # Resizing the table fonts also recomputes each table's row height from the font metrics
+        self.fonts.set_table_size(self.text_size)
 
     def update_widget_font(self, widget_name, font):
         self.widget_fonts[widget_name] = font
@@ -419,22 +528,8 @@ class DeviceMonitorApp(tk.Tk):
         else:
             font_size = int(font_size)
 
-        font_config = (font_family, font_size, font_style)
-
-        if widget_name == "label_tree1":
-            self.label_tree1.config(font=font_config)
-        elif widget_name == "label_tree2":
-            self.label_tree2.config(font=font_config)
-        elif widget_name == "tree1":
-            style = ttk.Style()
-            style.configure("Treeview", font=font_config )
-            self.tree1.configure(style="Treeview" )
-        elif widget_name == "tree2":
-            style = ttk.Style()
-            style.configure("Treeview", font=font_config)
-            self.tree2.configure(style="Treeview")
-        elif widget_name == "title_label":
-            self.title_label.config(font=font_config)
+        if widget_name in self.fonts.fonts:
+            self.fonts.set_font(widget_name, font_family, font_size, font_style)
 
     def save_font_settings(self):
         with open("font_settings.json", "w") as file:
@@ -456,27 +551,8 @@ class DeviceMonitorApp(tk.Tk):
         if self.font_underline:
             font_style += " underline"
 
-        font = (self.font_family, self.text_size, font_style)
-        style = ttk.Style()
-        style.configure('Treeview', font=font)
-
-    def update_treeview_style(self):
-        style = ttk.Style()
-        style.configure("Custom.Treeview", font=("Helvetica", self.text_size),
-                        rowheight=30 + self.text_size)  # Adjust the row height dynamically
-        self.tree1.configure(style="Custom.Treeview")
-        self.tree2.configure(style="Custom.Treeview")
-
-
-    def apply_text_size(self):
-        # Update text size in Treeview
-        style = ttk.Style()
-        style.configure('Treeview', font=('Helvetica', self.text_size))
-
-        # Adjust the row height in Treeview
-        row_height = 100  # Adjust row height based on text size
-        self.tree1.configure(style="my.Treeview", rowheight=row_height)
-        self.tree2.configure(style="my.Treeview", rowheight=row_height)
+        for widget_name in ('tree1', 'tree2'):
+            self.fonts.set_font(widget_name, self.font_family, self.text_size, font_style)
 
 
 
@@ -501,20 +577,23 @@ class DeviceMonitorApp(tk.Tk):
         left_spacer = tk.Frame(self.entry_frame, width=20)
         left_spacer.pack(side="left")
 
-        left_image = Image.open("ntpclogo.png")
-        left_image = left_image.resize((desired_widthl, desired_heightl))
-        left_image = self.make_rounded_image(left_image)
-        left_photo = ImageTk.PhotoImage(left_image)
+        # Logos are filled in by load_logos once the first frame is up; a blank image of the
+        # same size holds their place so the header does not move
+        left_photo = tk.PhotoImage(width=desired_widthl, height=desired_heightl)
+        self.left_image_label = tk.Label(self.entry_frame, image=left_photo)
+        self.left_image_label.photo = left_photo  # Keep a reference to the image
+        self.left_image_label.pack(side="left", padx=5)
+        self.logos = [(self.left_image_label, "ntpclogo.png", (desired_widthl, desired_heightl))]
 
-        left_image_label = tk.Label(self.entry_frame, image=left_photo)
-        left_image_label.photo = left_photo  # Keep a reference to the image
-        left_image_label.pack(side="left", padx=5)
 
 
-
-        self.title_label = tk.Label(self.entry_frame, text=self.title_text, font=('Helvetica', 24, 'bold'))
+        self.title_label = tk.Label(self.entry_frame, text=self.title_text, font=self.fonts.font('title_label'))
         self.title_label.pack(side="left", expand=True)
 
+        # Fleet summary next to the title, kept up to date by update_summary
+        self.summary_label = tk.Label(self.entry_frame, text="", justify="left", font=('Helvetica', 12))
+        self.summary_label.pack(side="left", padx=10)
+
         line_label = tk.Label(self.entry_frame, text="_" * 50,
                               font=('Helvetica', 1))  # Adjust font size and line length
         line_label.pack(side="bottom")
@@ -528,18 +607,27 @@ class DeviceMonitorApp(tk.Tk):
         right_bottom_frame = tk.Frame(self.entry_frame)
         right_bottom_frame.pack(side="right", padx=5)
 
-        right_image = Image.open("auraiya.png")
-        right_image = right_image.resize((desired_widthr, desired_heightr))
-        right_image = self.make_rounded_image(right_image)
-        right_photo = ImageTk.PhotoImage(right_image)
-
-        right_image_label = tk.Label(right_bottom_frame, image=right_photo)
-        right_image_label.photo = right_photo  # Keep a reference to the image
-        right_image_label.pack(side="top", padx=5 , pady=0)
+        right_photo = tk.PhotoImage(width=desired_widthr, height=desired_heightr)
+        self.right_image_label = tk.Label(right_bottom_frame, image=right_photo)
+        self.right_image_label.photo = right_photo  # Keep a reference to the image
+        self.right_image_label.pack(side="top", padx=5 , pady=0)
+        self.logos.append((self.right_image_label, "auraiya.png", (desired_widthr, desired_heightr)))
 
         settings_button = tk.Button(right_bottom_frame, text="Settings", command=self.open_settings)
         settings_button.pack(side="top", padx=5)  # Add some vertical padding (e.g., 10 pixels)
 
+        # Filter box: narrows both tables as you type (name, IP, status or table label)
+        filter_frame = tk.Frame(self)
+        filter_frame.pack(side="top", fill="x", padx=10)
+        tk.Label(filter_frame, text="Filter:").pack(side="left")
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.schedule_filter())
+        tk.Entry(filter_frame, textvariable=self.filter_var, width=40).pack(side="left", padx=5)
+
+        # Status bar along the bottom edge, packed before the tables so it spans the window
+        self.status_label = tk.Label(self, text="Monitoring...", anchor="w")
+        self.status_label.pack(side="bottom", fill="x", padx=10)
+
         # Frames for treeviews including labels
         self.tree_frame1 = tk.Frame(self, padx=5, pady=0)
         self.tree_frame2 = tk.Frame(self, padx=5, pady=0)
@@ -547,54 +635,54 @@ class DeviceMonitorApp(tk.Tk):
         self.tree_frame2.pack(side="right", expand=True, fill="both", padx=5)
 
         # Create and pack the labels above the treeviews
-        self.label_tree1 = tk.Label(self.tree_frame1, text="Table 1", font=('Helvetica', 22, 'bold'))
-        self.label_tree2 = tk.Label(self.tree_frame2, text="Table 2", font=('Helvetica', 22, 'bold'))
+        self.label_tree1 = tk.Label(self.tree_frame1, text="Table 1", font=self.fonts.font('label_tree1'))
+        self.label_tree2 = tk.Label(self.tree_frame2, text="Table 2", font=self.fonts.font('label_tree2'))
         self.label_tree1.pack(side="top", fill="x")
         self.label_tree2.pack(side="top", fill="x")
 
         # Treeviews
-        self.tree1 = self.create_treeview(self.tree_frame1, corner_radius=10)
-        self.tree2 = self.create_treeview(self.tree_frame2, corner_radius=10)
+        self.tree1 = self.create_treeview(self.tree_frame1, corner_radius=10, widget_name='tree1')
+        self.tree2 = self.create_treeview(self.tree_frame2, corner_radius=10, widget_name='tree2')
         self.tree1.pack(expand=True, fill="both", padx=5, pady=5)
         self.tree2.pack(expand=True, fill="both", padx=5, pady=5)
 
-    def make_rounded_image(self, image):
-        # Make the border of the image curved
-        corner_radius = 10  # You can adjust this value based on your preference
-
-        mask = Image.new("L", image.size, 0)
-        draw = ImageDraw.Draw(mask)
-        draw.rounded_rectangle((0, 0, image.width, image.height), corner_radius, fill=255)
-
-        result = Image.new("RGBA", image.size, (0, 0, 0, 0))
-        result.paste(image, mask=mask)
+        # Row bookkeeping for each table, keyed like the 'table' field in device_data.json
+        self.tables = {
+            'tree1': DeviceTable('tree1', self.tree1, self.device_values, self.row_image_source()),
+            'tree2': DeviceTable('tree2', self.tree2, self.device_values, self.row_image_source()),
+        }
 
-        return result
+    def load_logos(self):
+        # Cached, pre-rounded PNGs from assets.py; only the first launch after a logo changes processes it
+        corner_radius = 10  # You can adjust this value based on your preference
+        for label, filename, size in self.logos:
+            photo = load_image(self, filename, size, corner_radius)
+            if photo is not None:
+                label.config(image=photo)
+                label.photo = photo  # Keep a reference to the image
 
     def update_font(self, font_family, font_size, font_style):
+        # Reconfigure every named font; Tk redraws the widgets using them in one pass
         self.font_family = font_family
         self.text_size = int(font_size)
         self.font_style = font_style
-        self.apply_font_to_widgets()
-
-    def apply_font_to_widgets(self):
-        font = (self.font_family, self.text_size, self.font_style)
-        self.option_add("*Font", font)
-        self.refresh_widgets(self)
-
-    def refresh_widgets(self, parent):
-        for widget in parent.winfo_children():
-            widget.update()
-            if widget.winfo_children():
-                self.refresh_widgets(widget)
+        for widget_name in self.fonts.fonts:
+            size = self.text_size if widget_name in ('tree1', 'tree2') else None
+            self.fonts.set_font(widget_name, font_family, size, font_style)
 
     def open_settings(self):
         # Open Password Dialog first. If the password is correct, open_settings_dialog will be called.
         PasswordDialog(self, self.open_settings_dialog)
 
     def open_settings_dialog(self):
-        # Open Settings Dialog only after successful password entry
-        SettingsDialog(self, self)
+        # Open Settings Dialog only after successful password entry; it is built
+        # on first use and afterwards only refreshed and shown again
+        if self.settings_dialog is None or not self.settings_dialog.winfo_exists():
+            self.settings_dialog = SettingsDialog(self, self)
+        else:
+            self.settings_dialog.load_values()
+            self.settings_dialog.deiconify()
+        self.settings_dialog.lift()
 
 
     def update_settings(self, resolution, text_size, hide_ip):
@@ -603,43 +691,179 @@ class DeviceMonitorApp(tk.Tk):
         self.hide_ip = hide_ip
         self.apply_text_size()
 
-    def update_ip_visibility(self):
-        for device in self.devices.values():
-            if self.hide_ip:
-                ip_text = '*******'
+    def process_results(self):
+        # The next frame is scheduled even if this one fails, so one error cannot freeze the UI
+        try:
+            self.apply_frame()
+        finally:
+            self.after(FRAME_INTERVAL, self.process_results)
+
+    def apply_frame(self):
+        # Drain the result queue within a fixed frame budget and apply it as one batch.
+        # Only the newest event per device is kept, so a state storm costs one row update per device.
+        deadline = time.perf_counter() + FRAME_BUDGET
+
+        # Rows scrolled into view since the last frame get their sparklines first,
+        # then the ones that did not fit in the last frame's render budget
+        for table in self.tables.values():
+            table.update_window()
+        for device in self.sparklines.start_frame():
+            if self.devices.get(device.name) is device:
+                device.table.refresh(device)
+
+        results = {}
+        probing = {}
+        reports = []
+        while time.perf_counter() < deadline:
+            try:
+                event = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            kind = event[0]
+            if kind == "result":
+                results[event[1]] = event[2]
+                probing.pop(event[1], None)
+            elif kind == "probe_start":
+                probing[event[1]] = True
+            else:
+                reports.append(event)
+
+        # Devices removed while their probe was in flight are skipped
+        for device in probing:
+            if self.devices.get(device.name) is device:
+                self.set_to_grey(device)
+        for device in results:
+            if self.devices.get(device.name) is device:
+                self.update_device_status(device)
+        # Sorted tables move the rows whose key changed, once for the whole batch
+        for table in self.tables.values():
+            table.resort()
+        for report in reports:
+            if report[0] == "sweep":
+                self.report_sweep(report[1], report[2])
             else:
-                ip_text = device.ip
-            device.tree.item(device.item, values=(device.tree.index(device.item) + 1, device.name, ip_text, device.status))
+                self.report_overrun(report[1])
+
+        # Repaint the summary when counts changed, and once a second while an outage clock runs
+        if self.summary_dirty or (self.engine.outages and time.time() - self.summary_updated >= SUMMARY_REFRESH):
+            self.update_summary()
+
+    def update_table_mode(self, virtual):
+        # Rebuild both tables with the other table class, keeping device order
+        if virtual == self.virtual_tables:
+            return
+        self.virtual_tables = virtual
+        table_class = VirtualDeviceTable if virtual else DeviceTable
+        for name, table in self.tables.items():
+            devices = list(table.rows)
+            # The engine may have changed a status the UI has not processed yet; the new table
+            # counts what the old one did, so recount still sees that transition
+            counted = dict(table.counted)
+            table.clear()
+            self.tables[name] = table_class(name, table.tree, self.device_values, self.row_image_source())
+            if table.sort_column is not None:
+                # Sorted before the devices go in, so each one lands at the end
+                self.tables[name].sort_by(table.sort_column, table.sort_reverse)
+            for device in devices:
+                self.tables[name].insert(device, counted.get(device))
+        self.schedule_filter()
+
+    def row_image_source(self):
+        return self.sparklines.image if self.show_sparklines else None
+
+    def update_sparklines(self, show):
+        if show == self.show_sparklines:
+            return
+        self.show_sparklines = show
+        for table in self.tables.values():
+            table.tree.configure(show='tree headings' if show else 'headings')
+            table.row_image = self.row_image_source()
+            table.refresh_all()
+        if not show:
+            self.sparklines.clear()
+
+    def report_sweep(self, duration, count):
+        if self.overrun_timer is not None:
+            self.after_cancel(self.overrun_timer)
+            self.overrun_timer = None
+        self.status_label.config(text=f"Last sweep: {count} devices in {duration:.2f} s "
+                                      f"(every {self.engine.cycle_period:g} s)", fg="black")
+
+    def report_overrun(self, message):
+        # Already logged by the scheduler; make it visible to the operator too. The scheduler
+        # repeats the report every REPORT_PERIOD while it stays behind, so the message is
+        # cleared once two periods pass without one (adaptive mode sends no sweep reports).
+        self.status_label.config(text=message, fg="red")
+        if self.overrun_timer is not None:
+            self.after_cancel(self.overrun_timer)
+        self.overrun_timer = self.after(int(REPORT_PERIOD * 2000), self.clear_overrun)
+
+    def clear_overrun(self):
+        self.overrun_timer = None
+        self.status_label.config(text="Monitoring...", fg="black")
+
+    def device_values(self, device, serial):
+        # Row tuple for the Treeview columns, in create_treeview order
+        ip_text = '*******' if self.hide_ip else device.ip
+        if device.rtt_avg is None:
+            rtt_text = "-"
+        else:
+            rtt_text = f"{format_ms(device.rtt_min)}/{format_ms(device.rtt_avg)}/{format_ms(device.rtt_max)}"
+        loss_text = "-" if device.loss is None else f"{device.loss:.0f}%"
+        return (serial, device.name, ip_text, device.status, rtt_text, format_ms(device.jitter), loss_text)
+
+    def sort_table(self, table_name, column):
+        table = self.tables[table_name]
+        table.sort_by(column, reverse=table.sort_column == column and not table.sort_reverse)
+        self.update_headings(table)
+
+    def update_headings(self, table):
+        # The sorted column's heading shows the direction
+        for column, text in COLUMN_HEADINGS.items():
+            if column == table.sort_column:
+                text += " \u25bc" if table.sort_reverse else " \u25b2"
+            table.tree.heading(column, text=text)
+
+    def update_ip_visibility(self):
+        for table in self.tables.values():
+            table.refresh_all()
 
 
     def apply_text_size(self):
-        # Update text size in Treeview
-        style = ttk.Style()
-        style.configure('Treeview', font=('Helvetica', self.text_size))
+        # Update text size in both tables
+        self.fonts.set_table_size(self.text_size)
 
-    def create_treeview(self, parent, corner_radius):
+    def create_treeview(self, parent, corner_radius, widget_name):
         style_name = f"rounded_treeview_{corner_radius}"
 
         # Check if the style has been created before
         if not hasattr(self, '_style_created'):
             style = ttk.Style()
-            style.configure(style_name, font=("Helvetica", self.text_size), rowheight=30)
+            style.configure(style_name, rowheight=30)
             style.element_create(style_name, "from", "default")
             style.layout(style_name, [('Treeview.treearea', {'sticky': 'nswe'})])
 
             # Set the flag to indicate that the style has been created
             self._style_created = True
 
-        tree = ttk.Treeview(parent, style=style_name, columns=("Serial", "Name", "IP", "Status"), show='headings')
-        tree.heading("Serial", text="Serial No")
-        tree.heading("Name", text="Name")
-        tree.heading("IP", text="IP")
-        tree.heading("Status", text="Status")
+        # Each table has its own style derived from the shared one, carrying its named font
+        tree = ttk.Treeview(parent, style=self.fonts.table_style(widget_name, style_name),
+                            columns=tuple(COLUMN_HEADINGS), show='headings')
+        # Clicking a heading sorts the table by that column; clicking it again reverses the order
+        for column, text in COLUMN_HEADINGS.items():
+            tree.heading(column, text=text, command=lambda column=column: self.sort_table(widget_name, column))
 
         tree.column("Serial", width=5, anchor=tk.CENTER)
         tree.column("Name", width=250)
         tree.column("IP", width=50, anchor=tk.CENTER)
         tree.column("Status", width=20, anchor=tk.CENTER)
+        tree.column("RTT", width=60, anchor=tk.CENTER)
+        tree.column("Jitter", width=20, anchor=tk.CENTER)
+        tree.column("Loss", width=15, anchor=tk.CENTER)
+
+        # The tree column holds the RTT sparkline image; it is only shown when sparklines are on
+        tree.heading("#0", text="Trend")
+        tree.column("#0", width=SPARKLINE_SIZE[0] + 20, stretch=False)
 
         return tree
 
@@ -648,180 +872,229 @@ class DeviceMonitorApp(tk.Tk):
         ip = self.ip_entry.get()
         if name and ip:
             # Choose the table based on the selected option
-            selected_tree = self.tree1 if self.selected_tree_var.get() == 'tree1' else self.tree2
             device = Device(name, ip)
-            device.item = selected_tree.insert("", tk.END, values=(len(self.devices) + 1, name, ip, "Unknown"))
-            device.tree = selected_tree
-            self.devices[name] = device
+            if not self.register_device(device, self.selected_tree_var.get()):
+                return
             self.name_entry.delete(0, tk.END)
             self.ip_entry.delete(0, tk.END)
             self.save_devices()
-            self.reset_device_cycle()
 
     def remove_selected(self):
-        for tree in [self.tree1, self.tree2]:
-            selected_item = tree.selection()
-            if selected_item:
-                devices_copy = dict(self.devices)  # Create a copy of the devices dictionary
-
-                device_to_remove = None
-                for name, device in devices_copy.items():
-                    if device.item == selected_item[0]:
-                        tree.delete(selected_item[0])
-                        device_to_remove = name
-                        break
-
-                if device_to_remove:
-                    del self.devices[device_to_remove]
-                    self.save_devices()
-                    self.reset_device_cycle()  # Reset device cycle after removing a device
-                    break
+        # Every selected row in both tables goes in one operation
+        selected = []
+        for table in self.tables.values():
+            selected.extend(table.selected_devices())
+        self.remove_devices(selected)
+
+    def remove_devices(self, devices):
+        # One bulk delete per table, then a single save and scheduler update
+        devices = self.engine.remove_devices(devices)
+        if not devices:
+            return
+        for table in self.tables.values():
+            table.remove(devices)
+        for device in devices:
+            self.clear_alarm(device)
+            self.sparklines.discard(device)
+            self.search.remove(device)
+        self.summary_dirty = True
+        self.save_devices()
+
+    def register_device(self, device, table_name, parent=None):
+        # A new device goes into its table, the engine and the search index. Names identify
+        # devices (device_data.json is keyed by them), so duplicates are refused; the table is
+        # filled first so it counts the device before its first probe can change its status.
+        if device.name in self.devices:
+            tk.messagebox.showerror("Error", f"A device named {device.name!r} already exists",
+                                    parent=parent or self)
+            return False
+        self.tables[table_name].insert(device)
+        self.engine.add_device(device)
+        self.search.add(device)
+        self.summary_dirty = True
+        if self.filter_var.get().strip():
+            self.schedule_filter()
+        return True
+
+    def schedule_filter(self):
+        # Keystrokes and status changes within one idle pass cost one filter run
+        if not self.filter_pending:
+            self.filter_pending = True
+            self.after_idle(self.apply_filter)
+
+    def apply_filter(self):
+        self.filter_pending = False
+        words = self.filter_var.get().lower().split()
+        # Name and IP come from the index, status from the tables' per-status sets
+        found = {word: self.search.lookup(word) for word in words}
+        word_statuses = {word: [status for status in STATUSES if status.lower().startswith(word)]
+                         for word in words}
+        self.filter_statuses = {status for statuses in word_statuses.values() for status in statuses}
+        for name, label in (('tree1', self.label_tree1), ('tree2', self.label_tree2)):
+            table = self.tables[name]
+            label_text = label.cget("text").lower()
+            matches = None  # every device
+            for word in words:
+                if word in label_text:
+                    continue  # the table's label matches, so every row of it does
+                sets = [found[word]] + [table.by_status[status] for status in word_statuses[word]]
+                word_matches = sets[0] if len(sets) == 1 else set().union(*sets)
+                matches = word_matches if matches is None else matches & word_matches
+            table.set_filter(matches)
 
     def reset_device_cycle(self):
-        # Reset the device cycle with the current devices
-        self.device_cycle = cycle(self.devices.values())
-
-    def update_device_status(self, device, status):
-        color = 'green' if status else 'red'
-        device.status = "Online" if status else "Offline"
-
-        # Check if IP should be hidden
-        if self.hide_ip:
-            ip_text = '*******'
-        else:
-            ip_text = device.ip
-
-        device.tree.item(device.item, values=(device.tree.index(device.item) + 1, device.name, ip_text, device.status),
-                         tags=(color,))
-        device.tree.tag_configure('green', foreground='green')
-        device.tree.tag_configure('red', foreground='red')
+        self.engine.reset_device_cycle()
+
+    def update_device_status(self, device):
+        # The engine has already applied the result to the device; this only renders it
+        old_status = device.table.recount(device)
+        if old_status is not None:
+            self.status_changed(device, old_status)
+        # A device already in alarm keeps flashing while it stays offline
+        device.tag = 'green' if device.status == "Online" else ('alarm' if device.alarm else 'red')
+        device.table.refresh(device)
+        device.table.queue_resort(device)
+
+    def status_changed(self, device, old_status):
+        # O(1) bookkeeping per transition; outages are queued in start order
+        if device.status == "Offline":
+            self.alarm_queue[device] = device.offline_since or time.time()
+        elif old_status == "Offline":
+            self.clear_alarm(device)
+        self.summary_dirty = True
+        if old_status in self.filter_statuses or device.status in self.filter_statuses:
+            self.schedule_filter()  # the filter matches on status
+
+    def blink(self):
+        # One timer for the whole fleet. Outages queue up in start order, so only the head
+        # of alarm_queue can have crossed the threshold; each device joins the alarm tag once.
+        now = time.time()
+        while self.alarm_queue:
+            device, since = next(iter(self.alarm_queue.items()))
+            if now - since < self.alarm_after:
+                break
+            del self.alarm_queue[device]
+            device.alarm = True
+            device.tag = 'alarm'
+            device.table.refresh(device)
+            self.alarm_count += 1
+
+        # Flashing is two tag_configure calls per tick, however many rows carry the tag
+        if self.alarm_count or self.blink_on:
+            self.blink_on = not self.blink_on and self.alarm_count > 0
+            foreground, background = ALARM_COLOURS[self.blink_on]
+            for table in self.tables.values():
+                table.tree.tag_configure('alarm', foreground=foreground, background=background)
+        self.after(BLINK_INTERVAL, self.blink)
+
+    def clear_alarm(self, device):
+        self.alarm_queue.pop(device, None)
+        if device.alarm:
+            device.alarm = False
+            self.alarm_count -= 1
+
+    def update_summary(self):
+        lines = []
+        totals = dict.fromkeys(("Online", "Offline", "Unknown"), 0)
+        for table, label in ((self.tables['tree1'], self.label_tree1), (self.tables['tree2'], self.label_tree2)):
+            counts = table.counts
+            for status in totals:
+                totals[status] += counts[status]
+            lines.append(f"{label.cget('text')}: {counts['Online']} online, {counts['Offline']} offline, "
+                         f"{counts['Unknown']} unknown")
+        total_line = f"Total: {totals['Online']} online, {totals['Offline']} offline, {totals['Unknown']} unknown"
+        outage = self.engine.longest_outage()
+        if outage is not None:
+            device, since = outage
+            total_line += f"  |  Longest outage: {device.name} ({format_duration(time.time() - since)})"
+        lines.append(total_line)
+        self.summary_label.config(text="\n".join(lines))
+        self.summary_dirty = False
+        self.summary_updated = time.time()
 
     def monitor_devices(self):
-        if not self.devices:
-            # If there are no devices, reset the device cycle and return
-            self.reset_device_cycle()
-            return
-
-        try:
-            device = next(self.device_cycle)
-        except StopIteration:
-            # Reset the device cycle if it's empty and try again
-            self.reset_device_cycle()
-            try:
-                device = next(self.device_cycle)
-            except StopIteration:
-                # If it's still empty, then there are no devices to monitor
-                return
-
-        self.set_to_grey(device)
-        self.after(1000, lambda: self.thread_pool.submit(self.ping_and_update, device))
-        self.after(1000, self.monitor_devices)  # Continue with the next device
+        # Starting an already running engine is a no-op
+        self.engine.start()
 
     # Add this function to initiate monitoring
     def start_monitoring(self):
-        if not self.devices:
-            # If there are no devices, reset the device cycle and return
-            self.reset_device_cycle()
-            return
-
         self.monitor_devices()
 
     def set_to_grey(self, device):
-        item_id = device.item
-        tree_name = device.tree
-
-        # Check if the item exists in the specified tree
-        if item_id in tree_name.get_children():
-            tree_name.item(item_id, tags=('grey',))
-        else:
-            print(f"Item {item_id} not found in the {tree_name} tree.")
+        # Only rows still waiting for their first result turn grey; rows that have a status
+        # keep their colour while they are re-probed, so steady-state probes cost no Tcl calls
+        if device.status != "Unknown":
+            return
+        table = device.table
+        if table is None:
+            logger.warning("Device %s is not in any table", device.name)
+            return
 
-    def ping_and_update(self, device):
-        status = ping(device.ip)
-        self.after(0, lambda: self.update_device_status(device, status))
+        # The table's item index says whether the row is on screen; rows scrolled out of a
+        # virtualized table are drawn grey when they come into view
+        device.tag = 'grey'
+        if table.shows(device):
+            table.refresh(device)
 
     def save_devices(self):
-        try:
-            device_data = {
-                'devices': {
-                    name: {
-                        'ip': device.ip,
-                        'table': 'tree1' if device.tree == self.tree1 else 'tree2'
-                    } for name, device in self.devices.items()
-                },
-                'labels': {
-                    'label_tree1': self.label_tree1.cget("text"),
-                    'label_tree2': self.label_tree2.cget("text")
-                },
-                'settings': {
-                    'title': self.title_text,  # Existing title
-                    'text_size': self.text_size,  # Save the current font size
-                    'hide_ip': self.hide_ip  # Save the state of IP address visibility
-                }
-            }
-
-            with open(self.data_file, 'w') as file:
-                json.dump(device_data, file, indent=4)
-        except Exception as e:
-            print(f"Error saving devices: {e}")
+        # The engine writes device_data.json; the UI contributes its own settings and labels
+        self.engine.save(settings={
+            'title': self.title_text,  # Existing title
+            'text_size': self.text_size,  # Save the current font size
+            'hide_ip': self.hide_ip,  # Save the state of IP address visibility
+            'virtual_tables': self.virtual_tables,
+            'show_sparklines': self.show_sparklines,
+            'alarm_after': self.alarm_after
+        }, labels={
+            'label_tree1': self.label_tree1.cget("text"),
+            'label_tree2': self.label_tree2.cget("text")
+        })
 
     def load_devices(self):
-        if not os.path.exists(self.data_file):
+        # Scan settings, workers and the devices themselves are loaded by the engine
+        if not self.engine.load():
             return
+        labels = self.engine.labels
+        settings = self.engine.settings
 
-        with open(self.data_file, 'r') as file:
-            loaded_data = json.load(file)
-            loaded_devices = loaded_data.get('devices', {})
-            labels = loaded_data.get('labels', {})
-            settings = loaded_data.get('settings', {})
-
-            # Load settings
-            loaded_title = settings.get('title', "Device Monitor Application")
-            self.title_text = loaded_title  # Set the title_text to the loaded title
-            self.update_treeview_row_height()
-
-            # Set hide_ip before loading devices
-            self.hide_ip = settings.get('hide_ip', False)
-
-            for name, data in loaded_devices.items():
-                ip = data.get('ip')
-                table_choice = data.get('table', 'tree1')
-                tree = self.tree1 if table_choice == 'tree1' else self.tree2
-                device = Device(name, ip)
-                device.tree = tree
-                if self.hide_ip:
-                    ip = '*******'
-                device.item = tree.insert("", tk.END, values=(len(self.devices) + 1, name, ip, "Unknown"))
-                self.devices[name] = device
-
-            # Update the title after loading all devices
-            self.update_title(loaded_title)
-
-            # Update the labels after loading all devices
-            self.label_tree1.config(text=labels.get('label_tree1', "Table 1"))
-            self.label_tree2.config(text=labels.get('label_tree2', "Table 2"))
-
-            # Update the IP visibility after loading all devices
-            self.update_ip_visibility()
-    def reset_device_cycle(self):
-        # Combine devices from both tables
-        devices_combined = list(self.devices.values())
-        self.device_cycle = cycle(devices_combined)
+        # Load settings
+        loaded_title = settings.get('title', "Device Monitor Application")
+        self.title_text = loaded_title  # Set the title_text to the loaded title
+        self.update_treeview_row_height()
 
-    def monitor_devices(self):
-        try:
-            device = next(self.device_cycle)
-        except StopIteration:
-            self.reset_device_cycle()
-            device = next(self.device_cycle)
+        # Set hide_ip before loading devices
+        self.hide_ip = settings.get('hide_ip', False)
+        self.update_table_mode(settings.get('virtual_tables', False))
+        self.update_sparklines(settings.get('show_sparklines', False))
+        self.alarm_after = settings.get('alarm_after', ALARM_AFTER)
+
+        for device in self.devices.values():
+            self.tables.get(device.table_name, self.tables['tree1']).insert(device)
+            self.search.add(device)
+
+        # Update the title after loading all devices
+        self.update_title(loaded_title)
+
+        # Update the labels after loading all devices
+        self.label_tree1.config(text=labels.get('label_tree1', "Table 1"))
+        self.label_tree2.config(text=labels.get('label_tree2', "Table 2"))
 
-        self.set_to_grey(device)
-        self.after(1000, lambda: self.thread_pool.submit(self.ping_and_update, device))
-        self.after(1000, self.monitor_devices)  # Continue with the next device
+        # Update the IP visibility after loading all devices
+        self.update_ip_visibility()
 
 
 if __name__ == "__main__":
-    app = DeviceMonitorApp(resolution='1920x1080', text_size=15, title_text="Your Title Here")
+    multiprocessing.freeze_support()  # lets probe worker processes start from a PyInstaller build
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Network Monitoring Using Ping")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.headless:
+        # No window at all: the engine monitors on its own until interrupted
+        run_headless(args.data_file, args.status_file, args.status_interval)
+        raise SystemExit
+    app = DeviceMonitorApp(resolution='1920x1080', text_size=15, title_text="Your Title Here",
+                           data_file=args.data_file)
     app.start_monitoring()
     app.tk_setPalette(background='light blue', foreground='black', activeBackground='gray80', activeForeground='black')
     app.mainloop()
@@ -0,0 +1,311 @@
+import asyncio
+import argparse
+import concurrent.futures
+import errno
+import logging
+import platform
+import random
+import re
+import socket
+import subprocess
+import time
+import weakref
+
+from icmp_engine import get_icmp_engine, resolve_async
+
+"""
+Probe backends for nms.py.
+
+Every backend exposes the same coroutine, probe(target), where target is any
+object with an `ip` attribute (normally a Device). Backends are registered by
+name so each device can pick the cheapest probe that works for it, and
+`python probes.py HOST...` benchmarks them against each other.
+
+A probe sends PACKETS_PER_PROBE packets and reports RTT min/avg/max, jitter
+and loss from the replies, so a degrading link shows up before it fails.
+
+Every packet waits at most the target's `timeout` (DEFAULT_TIMEOUT when unset),
+and run_probe() enforces an overall budget on top, so a probe's duration never
+depends on operating-system defaults.
+"""
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = "icmp"
+DEFAULT_TCP_PORT = 80
+DEFAULT_TIMEOUT = 1.0  # seconds to wait for each reply
+MAX_PING3_THREADS = 64  # blocking ping3 calls in flight; a dead host holds a thread for a full timeout
+MAX_TCP_CONNECTS = 512  # keeps concurrent connects well below the default descriptor limit
+PACKETS_PER_PROBE = 3
+PACKET_SPACING = 0.05  # seconds between the packets of one probe
+PING_SPACING = 0.2  # the shortest -i the ping command accepts without root
+WINDOWS_PING_SPACING = 1.0  # Windows ping has no interval option and sends one packet per second
+PING_TIME_PATTERN = re.compile(r"time[=<]\s*([\d.]+)\s*ms", re.IGNORECASE)
+
+
+class ProbeResult:
+    __slots__ = ("ok", "rtt", "rtt_min", "rtt_max", "jitter", "loss")
+
+    def __init__(self, ok, rtt=None, rtt_min=None, rtt_max=None, jitter=None, loss=None):
+        self.ok = ok  # True when the device answered
+        self.rtt = rtt  # average round-trip time in milliseconds, when the backend measures it
+        self.rtt_min = rtt if rtt_min is None else rtt_min
+        self.rtt_max = rtt if rtt_max is None else rtt_max
+        self.jitter = jitter  # mean difference between consecutive RTTs, in milliseconds
+        self.loss = (0.0 if ok else 100.0) if loss is None else loss  # percent of packets lost
+
+    @classmethod
+    def from_samples(cls, samples, sent=None):
+        # samples holds one RTT in milliseconds, or None, per packet sent
+        sent = len(samples) if sent is None else sent
+        rtts = [rtt for rtt in samples if rtt is not None]
+        loss = 100.0 * (sent - len(rtts)) / sent if sent else 100.0
+        if not rtts:
+            return cls(False, loss=loss)
+        jitter = None
+        if len(rtts) > 1:
+            jitter = sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / (len(rtts) - 1)
+        return cls(True, sum(rtts) / len(rtts), min(rtts), max(rtts), jitter, loss)
+
+
+class ProbeTarget:
+    # Minimal stand-in for a Device, used by the benchmark
+    def __init__(self, ip, port=None, timeout=DEFAULT_TIMEOUT):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+
+
+def probe_timeout(target):
+    return getattr(target, "timeout", None) or DEFAULT_TIMEOUT
+
+
+def probe_budget(target, backend):
+    # Longest a whole probe may take: the last packet's send offset plus its timeout, with slack
+    return (backend.count - 1) * backend.packet_spacing() + probe_timeout(target) + 0.5
+
+
+class ProbeBackend:
+    name = None
+    count = PACKETS_PER_PROBE
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def packet_spacing(self):
+        # Seconds between the packets of one probe, as sent on this platform
+        return PACKET_SPACING
+
+    async def probe(self, target):
+        # Packets go out PACKET_SPACING apart so jitter means something, without
+        # waiting for each reply; a dead host costs one timeout, not one per packet
+        async def delayed(index):
+            await asyncio.sleep(index * PACKET_SPACING)
+            return await self.probe_once(target)
+
+        samples = await asyncio.gather(*(delayed(index) for index in range(self.count)))
+        return ProbeResult.from_samples(samples)
+
+    async def probe_once(self, target):
+        # One packet/connection; returns the RTT in milliseconds or None
+        raise NotImplementedError
+
+
+BACKENDS = {}
+_instances = {}
+
+
+def register_backend(backend_class):
+    BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+def get_backend(name):
+    # Backends are stateless apart from shared sockets, so one instance per name
+    if name not in BACKENDS:
+        name = DEFAULT_BACKEND
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+async def run_probe(target, backend_name=None):
+    backend = get_backend(backend_name or getattr(target, "backend", DEFAULT_BACKEND))
+    try:
+        return await asyncio.wait_for(backend.probe(target), probe_budget(target, backend))
+    except (OSError, asyncio.TimeoutError):
+        return ProbeResult(False)
+    except Exception as error:
+        # e.g. UnicodeError from the idna codec for a mistyped host such as "a..b"
+        logger.warning("Probe of %s failed: %r", target.ip, error)
+        return ProbeResult(False)
+
+
+@register_backend
+class SubprocessPingBackend(ProbeBackend):
+    name = "subprocess"
+
+    def packet_spacing(self):
+        return WINDOWS_PING_SPACING if platform.system().lower() == 'windows' else PING_SPACING
+
+    async def probe(self, target):
+        # One process for all packets; per-packet times are parsed from its output
+        timeout = probe_timeout(target)
+        system = platform.system().lower()
+        if system == 'windows':
+            command = ['ping', '-n', str(self.count), '-w', str(int(timeout * 1000)), target.ip]
+        elif system == 'darwin':
+            command = ['ping', '-c', str(self.count), '-i', str(PING_SPACING), '-W', str(int(timeout * 1000)),
+                       target.ip]
+        else:
+            command = ['ping', '-c', str(self.count), '-i', str(PING_SPACING), '-W', str(max(int(round(timeout)), 1)),
+                       target.ip]
+        process = await asyncio.create_subprocess_exec(*command,
+                                                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            output, _ = await process.communicate()
+        finally:
+            if process.returncode is None:
+                process.kill()  # run_probe's budget ran out
+        samples = [float(match) for match in PING_TIME_PATTERN.findall(output.decode(errors="replace"))]
+        if process.returncode == 0 and not samples:
+            return ProbeResult(True)  # replies in a format we do not recognise
+        return ProbeResult.from_samples(samples[:self.count], self.count)
+
+
+@register_backend
+class IcmpBackend(ProbeBackend):
+    name = "icmp"
+
+    def packet_spacing(self):
+        if get_icmp_engine() is None:
+            return get_backend("subprocess").packet_spacing()
+        return PACKET_SPACING
+
+    async def probe(self, target):
+        if get_icmp_engine() is None:
+            # No ICMP socket permitted on this machine
+            return await get_backend("subprocess").probe(target)
+        # One name lookup per probe, not one per packet
+        address = await resolve_async(target.ip)
+        return await super().probe(ProbeTarget(address, getattr(target, "port", None), probe_timeout(target)))
+
+    async def probe_once(self, target):
+        return await get_icmp_engine().ping_async(target.ip, probe_timeout(target))
+
+
+@register_backend
+class Ping3Backend(ProbeBackend):
+    name = "ping3"
+
+    def __init__(self):
+        self.executor = None
+
+    @classmethod
+    def available(cls):
+        try:
+            import ping3  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    async def probe_once(self, target):
+        import ping3
+
+        # ping3 blocks, so it runs on its own threads; dead hosts must not starve the
+        # loop's small default executor, which getaddrinfo and friends also use
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(MAX_PING3_THREADS, thread_name_prefix="ping3")
+        loop = asyncio.get_running_loop()
+        timeout = probe_timeout(target)
+        rtt = await loop.run_in_executor(self.executor, lambda: ping3.ping(target.ip, timeout=timeout, unit="ms"))
+        if rtt is None or rtt is False:
+            return None
+        return rtt
+
+
+@register_backend
+class TcpConnectBackend(ProbeBackend):
+    # For devices that drop ICMP. Each probe is a bare non-blocking socket whose
+    # connect is driven by the loop's selector, so hundreds share one thread.
+    name = "tcp"
+
+    def __init__(self):
+        # One semaphore per event loop: the backend outlives a scheduler whose loop is replaced,
+        # e.g. when worker processes are switched off again
+        self.connect_slots = weakref.WeakKeyDictionary()
+
+    async def probe_once(self, target):
+        port = getattr(target, "port", None) or DEFAULT_TCP_PORT
+        loop = asyncio.get_running_loop()
+        connect_slots = self.connect_slots.get(loop)
+        if connect_slots is None:
+            connect_slots = self.connect_slots[loop] = asyncio.Semaphore(MAX_TCP_CONNECTS)
+
+        async with connect_slots:
+            infos = await loop.getaddrinfo(target.ip, port, family=socket.AF_INET, type=socket.SOCK_STREAM)
+            family, sock_type, proto, _, address = infos[0]
+            sock = socket.socket(family, sock_type, proto)
+            sock.setblocking(False)
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(loop.sock_connect(sock, address), probe_timeout(target))
+            except ConnectionRefusedError:
+                pass  # a reset still proves the host is up
+            except asyncio.TimeoutError:
+                return None
+            except OSError as error:
+                if error.errno != errno.ECONNREFUSED:
+                    return None
+            finally:
+                sock.close()
+            return (time.perf_counter() - started) * 1000.0
+
+
+@register_backend
+class FakeBackend(ProbeBackend):
+    # Simulated devices for demos and for load-testing the scheduler and UI
+    name = "fake"
+    up_ratio = 0.95
+    latency = (1.0, 20.0)
+
+    async def probe_once(self, target):
+        if random.random() >= self.up_ratio:
+            await asyncio.sleep(probe_timeout(target))
+            return None
+        rtt = random.uniform(*self.latency)
+        await asyncio.sleep(rtt / 1000.0)
+        return rtt
+
+
+async def benchmark(backend_name, hosts, rounds=3, port=None, timeout=DEFAULT_TIMEOUT):
+    targets = [ProbeTarget(host, port, timeout) for host in hosts]
+    started = time.perf_counter()
+    online = 0
+    for _ in range(rounds):
+        results = await asyncio.gather(*(run_probe(target, backend_name) for target in targets))
+        online += sum(result.ok for result in results)
+    elapsed = time.perf_counter() - started
+    return len(targets) * rounds / elapsed, online, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NMS probe backends against each other")
+    parser.add_argument("hosts", nargs="+")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--port", type=int, help="port for the tcp backend")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds to wait for each reply")
+    args = parser.parse_args()
+
+    for name in args.backends:
+        if name not in BACKENDS or not BACKENDS[name].available():
+            print(f"{name:>10}: not available")
+            continue
+        rate, online, elapsed = asyncio.run(benchmark(name, args.hosts, args.rounds, args.port, args.timeout))
+        print(f"{name:>10}: {rate:10.1f} probes/s  {online} replies  {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+
+from probes import run_probe
+
+"""
+asyncio monitoring engine for nms.py.
+
+The scheduler owns an event loop on its own thread. Every probe is a coroutine,
+so thousands can wait on the network at once; a semaphore bounds how many are
+in flight. Results are handed to callbacks and the Tk side only consumes them.
+
+Two modes are available. "sweep" probes the whole fleet concurrently once per
+cycle period. "adaptive" keeps a heap of devices keyed on when each is next
+due: every device has its own base interval, which is tightened right after a
+state change and stretched while the device stays stable, so probes are spent
+where they matter.
+
+Hosts that stay down back off exponentially up to DEAD_BACKOFF_CAP, and their
+probes run in a separate, smaller lane so a large outage cannot take the
+slots healthy devices need to keep their refresh rate.
+
+Each probe has a deadline: the next time its device is due in adaptive mode,
+the end of the cycle in sweep mode. A probe still waiting for a slot when its
+deadline passes is dropped rather than run late. Dispatch lag, dropped probes
+and sweeps that outrun their cycle are reported through on_overrun and logged.
+"""
+
+logger = logging.getLogger(__name__)
+
+SCAN_MODES = ("adaptive", "sweep")
+DEFAULT_INTERVAL = 5.0  # seconds between probes of one device in adaptive mode
+MIN_INTERVAL = 1.0
+TIGHTEN_FACTOR = 4  # a device that just changed state is probed this much more often
+STABLE_PROBES = 3  # identical results in a row before the interval starts to grow
+BACKOFF_FACTOR = 1.5
+MAX_STRETCH = 4  # a stable device is never probed less often than base interval x this
+DEAD_BACKOFF_CAP = 120.0  # longest wait, in seconds, between retries of a host that stays down
+LAG_THRESHOLD = 1.0  # seconds late before a dispatch counts as lag
+REPORT_PERIOD = 5.0  # overruns are summarised at most this often
+ERROR_PAUSE = 1.0  # seconds the loop waits after an unexpected error before carrying on
+
+
+class ScheduleEntry:
+    # Adaptive-mode bookkeeping for one device, owned by the scheduler thread
+    __slots__ = ("device", "interval", "last_ok", "stable_count", "failures", "next_due", "removed")
+
+    def __init__(self, device):
+        self.device = device
+        self.interval = self.base_interval()
+        self.last_ok = None
+        self.stable_count = 0
+        self.failures = 0  # consecutive failed probes
+        self.next_due = 0.0
+        self.removed = False
+
+    def base_interval(self):
+        return max(getattr(self.device, "interval", None) or DEFAULT_INTERVAL, MIN_INTERVAL)
+
+    def adapt(self, ok):
+        base = self.base_interval()
+        if ok != self.last_ok:
+            self.interval = max(base / TIGHTEN_FACTOR, MIN_INTERVAL)
+            self.stable_count = 0
+        elif ok:
+            self.stable_count += 1
+            if self.stable_count >= STABLE_PROBES:
+                self.interval = min(self.interval * BACKOFF_FACTOR, base * MAX_STRETCH)
+        else:
+            # Still down: double the wait on every further failure, up to the cap
+            self.interval = min(max(self.interval * 2, base), DEAD_BACKOFF_CAP)
+        self.failures = 0 if ok else self.failures + 1
+        self.last_ok = ok
+        return self.interval
+
+    def is_down(self):
+        return self.last_ok is False
+
+
+class ProbeScheduler:
+    def __init__(self, on_result, on_probe_start=None, on_sweep=None, on_overrun=None, mode="adaptive",
+                 cycle_period=5.0, max_concurrency=1000, down_concurrency=50):
+        self.on_result = on_result  # called as on_result(device, ProbeResult) from the scheduler thread
+        self.on_probe_start = on_probe_start
+        self.on_sweep = on_sweep  # called as on_sweep(duration_seconds, device_count) after each sweep
+        self.on_overrun = on_overrun  # called as on_overrun(message) when probes fall behind
+        self.mode = mode
+        self.cycle_period = cycle_period
+        self.max_concurrency = max_concurrency
+        self.down_concurrency = down_concurrency  # slots for hosts that were down at their last probe
+        self.devices = []
+        self.entries = {}  # device -> ScheduleEntry
+        self.due = []  # heap of (due_time, tie_breaker, ScheduleEntry)
+        self.counter = itertools.count()
+        self.wakeup = None
+        self.loop = None
+        self.thread = None
+        self.tasks = set()
+
+        # Overruns since the last report
+        self.max_lag = 0.0
+        self.skipped = 0
+        self.sweep_overrun = 0.0
+        self.last_report = 0.0
+
+    def start(self):
+        if self.thread is not None:
+            return
+        started = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(started,), name="probe-scheduler", daemon=True)
+        self.thread.start()
+        started.wait()
+
+    def run(self, started):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.down_lane = asyncio.Semaphore(self.down_concurrency)
+        self.wakeup = asyncio.Event()
+        self.loop.create_task(self.monitor())
+        self.loop.call_soon(started.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop)
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    async def shutdown(self):
+        current = asyncio.current_task()
+        pending = [task for task in asyncio.all_tasks() if task is not current]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self.loop.stop()
+
+    def set_devices(self, devices):
+        # Safe to call from the Tk thread; the new list takes effect on the loop
+        devices = list(devices)
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.replace_devices, devices)
+        else:
+            self.replace_devices(devices)
+
+    def replace_devices(self, devices):
+        # Devices we already track keep their adaptive state; new ones are due now
+        self.devices = devices
+        now = self.loop.time() if self.loop is not None else 0.0
+        entries = {}
+        for device in devices:
+            entry = self.entries.pop(device, None)
+            if entry is None:
+                entry = ScheduleEntry(device)
+                self.push(entry, now)
+            entries[device] = entry
+        for entry in self.entries.values():
+            entry.removed = True  # dropped lazily when it reaches the top of the heap
+        self.entries = entries
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def push(self, entry, due_time):
+        heapq.heappush(self.due, (due_time, next(self.counter), entry))
+        if self.wakeup is not None and self.due[0][2] is entry:
+            self.wakeup.set()  # new head of the heap, the dispatcher may be sleeping past it
+
+    def configure(self, mode=None, cycle_period=None):
+        # Plain attribute writes; the loop picks them up on its next cycle
+        if mode is not None:
+            if mode not in SCAN_MODES:
+                raise ValueError(f"Unknown scan mode: {mode}")
+            self.mode = mode
+        if cycle_period is not None:
+            self.cycle_period = max(float(cycle_period), 0.1)
+
+    async def monitor(self):
+        # A bug in one probe or callback must never end monitoring for the whole fleet
+        while True:
+            try:
+                if self.mode == "sweep":
+                    await self.sweep()
+                else:
+                    await self.dispatch_due()
+                self.report_overruns()
+            except Exception:
+                logger.exception("Monitoring pass failed")
+                await asyncio.sleep(ERROR_PAUSE)
+
+    def report_overruns(self):
+        now = self.loop.time()
+        if now - self.last_report < REPORT_PERIOD:
+            return
+        if not (self.max_lag or self.skipped or self.sweep_overrun):
+            return
+        parts = []
+        if self.max_lag:
+            parts.append(f"probes up to {self.max_lag:.1f} s late")
+        if self.skipped:
+            parts.append(f"{self.skipped} probes skipped")
+        if self.sweep_overrun:
+            parts.append(f"sweep overran its cycle by {self.sweep_overrun:.1f} s")
+        message = "Falling behind: " + ", ".join(parts)
+        logger.warning(message)
+        if self.on_overrun is not None:
+            self.on_overrun(message)
+        self.max_lag = 0.0
+        self.skipped = 0
+        self.sweep_overrun = 0.0
+        self.last_report = now
+
+    async def dispatch_due(self):
+        # Launch every probe that is due, then sleep until the next one is
+        now = self.loop.time()
+        while self.due and self.due[0][0] <= now:
+            due_time, _, entry = heapq.heappop(self.due)
+            if entry.removed:
+                continue
+            lag = now - due_time
+            if lag > LAG_THRESHOLD and due_time:
+                self.max_lag = max(self.max_lag, lag)
+            # Launch the probe and move on; a slow host never delays the next one
+            task = self.loop.create_task(self.probe_entry(entry, max(due_time, now) + entry.interval))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        timeout = self.due[0][0] - now if self.due else self.cycle_period
+        self.wakeup.clear()
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def probe_entry(self, entry, deadline):
+        # The entry is off the heap while its probe runs, so a device is never probed twice at once
+        try:
+            result = await self.probe(entry.device, deadline)
+        except Exception:
+            logger.exception("Probe of %s failed", entry.device.ip)
+            result = None
+        if result is None:
+            entry.next_due = deadline  # dropped; try again at the next regular slot
+        if not entry.removed:
+            self.push(entry, entry.next_due)
+
+    async def sweep(self):
+        # Hosts still inside their dead-host backoff sit this sweep out
+        started = self.loop.time()
+        devices = [device for device in self.devices
+                   if not (self.entries[device].is_down() and self.entries[device].next_due > started)]
+        if devices:
+            deadline = started + self.cycle_period
+            results = await asyncio.gather(*(self.probe(device, deadline) for device in devices),
+                                           return_exceptions=True)
+            for device, result in zip(devices, results):
+                if isinstance(result, Exception):
+                    logger.error("Probe of %s failed: %r", device.ip, result)
+            duration = self.loop.time() - started
+            if duration > self.cycle_period:
+                self.sweep_overrun = max(self.sweep_overrun, duration - self.cycle_period)
+            if self.on_sweep is not None:
+                self.on_sweep(duration, len(devices))
+        await asyncio.sleep(max(self.cycle_period - (self.loop.time() - started), 0))
+
+    async def probe(self, device, deadline=None):
+        # Returns the ProbeResult, or None when the probe was dropped for missing its deadline
+        entry = self.entries.get(device)
+        lane = self.down_lane if entry is not None and entry.is_down() else self.semaphore
+        async with lane:
+            if deadline is not None and self.loop.time() > deadline:
+                self.skipped += 1
+                return None
+            if self.on_probe_start is not None:
+                self.on_probe_start(device)
+            # Each device is probed with its own backend, see probes.py
+            result = await run_probe(device)
+        if entry is not None:
+            entry.next_due = self.loop.time() + entry.adapt(result.ok)
+        self.on_result(device, result)
+        return result
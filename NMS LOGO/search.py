@@ -0,0 +1,65 @@
+import collections
+import re
+
+"""
+In-memory search index for the device filter box in nms.py.
+
+Device names and IPs are indexed once, when a device is added, and dropped
+when it is removed. Queries of three or more characters are answered from a
+trigram index (any substring), shorter ones from a prefix index over name
+words and the IP, so a keystroke never scans the whole fleet's text.
+"""
+
+TOKEN_SPLIT = re.compile(r"[\s_\-.]+")
+
+
+def trigrams(text):
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self.texts = {}  # device -> indexed lower-case text
+        self.trigrams = collections.defaultdict(set)  # trigram -> devices
+        self.prefixes = collections.defaultdict(set)  # 1- and 2-character prefix -> devices
+
+    def __len__(self):
+        return len(self.texts)
+
+    def keys_for(self, device):
+        # The newline keeps trigrams from spanning the name and the IP
+        text = f"{device.name}\n{device.ip}".lower()
+        tokens = [token for token in TOKEN_SPLIT.split(device.name.lower()) if token] + [device.ip.lower()]
+        prefixes = {token[:length] for token in tokens for length in (1, 2) if len(token) >= length}
+        return text, trigrams(text), prefixes
+
+    def add(self, device):
+        text, grams, prefixes = self.keys_for(device)
+        self.texts[device] = text
+        for gram in grams:
+            self.trigrams[gram].add(device)
+        for prefix in prefixes:
+            self.prefixes[prefix].add(device)
+
+    def remove(self, device):
+        if self.texts.pop(device, None) is None:
+            return
+        _, grams, prefixes = self.keys_for(device)
+        for gram in grams:
+            self.trigrams[gram].discard(device)
+        for prefix in prefixes:
+            self.prefixes[prefix].discard(device)
+
+    def lookup(self, word):
+        # Devices whose name or IP contains word (starts with it, for one or two characters)
+        word = word.lower()
+        if len(word) < 3:
+            return set(self.prefixes.get(word, ()))
+        postings = sorted((self.trigrams.get(gram, set()) for gram in trigrams(word)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        # Trigrams can all occur without forming the substring, so confirm each candidate
+        return {device for device in candidates if word in self.texts[device]}
@@ -0,0 +1,207 @@
+import multiprocessing
+import multiprocessing.connection
+import signal
+import threading
+import zlib
+
+from icmp_engine import prefer_datagram
+from probes import ProbeResult, DEFAULT_BACKEND, DEFAULT_TIMEOUT
+from scheduler import ProbeScheduler, DEFAULT_INTERVAL
+
+"""
+Multi-process sharded probing for very large fleets.
+
+ShardedScheduler has the same interface as ProbeScheduler but splits the
+devices across worker processes, each running its own ProbeScheduler loop.
+Devices are assigned to shards by a stable hash of their name, so a device
+keeps its shard (and its adaptive state) when the fleet changes. Workers
+stream compact result tuples back over a pipe in small batches; the GUI
+process only turns them back into ProbeResults for its own Device objects.
+
+Probe-start notifications are not forwarded; they would double the pipe
+traffic for a purely cosmetic effect.
+"""
+
+FLUSH_INTERVAL = 0.1  # seconds a worker batches results before sending them
+
+
+class RemoteDevice:
+    # The probe-relevant fields of a Device, rebuilt inside a worker process
+    __slots__ = ("name", "ip", "backend", "port", "interval", "timeout")
+
+    def __init__(self, name, ip, backend=DEFAULT_BACKEND, port=None, interval=DEFAULT_INTERVAL,
+                 timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.ip = ip
+        self.backend = backend
+        self.port = port
+        self.interval = interval
+        self.timeout = timeout
+
+    def update(self, spec):
+        for field, value in spec.items():
+            setattr(self, field, value)
+
+
+def device_spec(device):
+    return {field: getattr(device, field, None) for field in RemoteDevice.__slots__}
+
+
+def shard_of(name, shard_count):
+    return zlib.crc32(name.encode()) % shard_count
+
+
+def worker_main(conn, mode, cycle_period):
+    # Ctrl+C reaches the whole process group; the parent process stops its workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # With raw sockets every worker would receive (and discard) every other worker's replies
+    prefer_datagram()
+    send_lock = threading.Lock()
+    results_lock = threading.Lock()
+    pending_results = []
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    def on_result(device, result):
+        with results_lock:
+            pending_results.append((device.name, result.ok, result.rtt, result.rtt_min, result.rtt_max,
+                                    result.jitter, result.loss))
+
+    scheduler = ProbeScheduler(on_result,
+                               on_sweep=lambda duration, count: send(("sweep", duration, count)),
+                               on_overrun=lambda message: send(("overrun", message)),
+                               mode=mode, cycle_period=cycle_period)
+    scheduler.start()
+    devices = {}
+
+    try:
+        while True:
+            if conn.poll(FLUSH_INTERVAL):
+                message = conn.recv()
+                kind = message[0]
+                if kind == "devices":
+                    # Reuse known objects so the scheduler keeps their adaptive state
+                    current = {}
+                    for spec in message[1]:
+                        device = devices.get(spec["name"])
+                        if device is None:
+                            device = RemoteDevice(**spec)
+                        else:
+                            device.update(spec)
+                        current[spec["name"]] = device
+                    devices = current
+                    scheduler.set_devices(devices.values())
+                elif kind == "configure":
+                    scheduler.configure(mode=message[1], cycle_period=message[2])
+                elif kind == "stop":
+                    break
+
+            with results_lock:
+                batch = pending_results[:]
+                del pending_results[:]
+            if batch:
+                send(("results", batch))
+    except (EOFError, OSError):
+        pass  # the GUI process went away
+    finally:
+        scheduler.stop()
+
+
+class ShardedScheduler:
+    def __init__(self, on_result, on_probe_start=None, on_sweep=None, on_overrun=None, mode="adaptive",
+                 cycle_period=5.0, workers=None):
+        self.on_result = on_result
+        self.on_sweep = on_sweep
+        self.on_overrun = on_overrun
+        self.mode = mode
+        self.cycle_period = cycle_period
+        self.worker_count = workers or multiprocessing.cpu_count()
+        self.devices_by_name = {}
+        self.sweeps = {}  # shard -> (duration, count) of its last sweep
+        self.connections = []
+        self.processes = []
+        self.reader = None
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        # Spawn rather than fork: the GUI process already runs Tk and scheduler threads
+        context = multiprocessing.get_context("spawn")
+        for _ in range(self.worker_count):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=worker_main, args=(child_conn, self.mode, self.cycle_period),
+                                      name="nms-probe-shard", daemon=True)
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+        self.running = True
+        self.send_devices()
+        self.reader = threading.Thread(target=self.read_results, name="shard-reader", daemon=True)
+        self.reader.start()
+
+    def stop(self):
+        self.running = False
+        for conn in self.connections:
+            try:
+                conn.send(("stop",))
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        for conn in self.connections:
+            conn.close()
+        self.connections = []
+        self.processes = []
+
+    def set_devices(self, devices):
+        self.devices_by_name = {device.name: device for device in devices}
+        if self.running:
+            self.send_devices()
+
+    def send_devices(self):
+        shards = [[] for _ in self.connections]
+        for name, device in self.devices_by_name.items():
+            shards[shard_of(name, len(shards))].append(device_spec(device))
+        for conn, specs in zip(self.connections, shards):
+            conn.send(("devices", specs))
+
+    def configure(self, mode=None, cycle_period=None):
+        if mode is not None:
+            self.mode = mode
+        if cycle_period is not None:
+            self.cycle_period = cycle_period
+        for conn in self.connections:
+            conn.send(("configure", mode, cycle_period))
+
+    def read_results(self):
+        # One thread waits on every worker pipe at once
+        connections = list(self.connections)
+        while self.running and connections:
+            for conn in multiprocessing.connection.wait(connections, timeout=0.5):
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    connections.remove(conn)
+                    continue
+                self.handle_message(self.connections.index(conn), message)
+
+    def handle_message(self, shard, message):
+        kind = message[0]
+        if kind == "results":
+            for name, ok, rtt, rtt_min, rtt_max, jitter, loss in message[1]:
+                device = self.devices_by_name.get(name)
+                if device is not None:
+                    self.on_result(device, ProbeResult(ok, rtt, rtt_min, rtt_max, jitter, loss))
+        elif kind == "sweep" and self.on_sweep is not None:
+            # Shards sweep in parallel, so the fleet's sweep takes as long as the slowest one
+            self.sweeps[shard] = message[1:]
+            self.on_sweep(max(duration for duration, _ in self.sweeps.values()),
+                          sum(count for _, count in self.sweeps.values()))
+        elif kind == "overrun" and self.on_overrun is not None:
+            self.on_overrun(f"Shard {shard + 1}: {message[1]}")
@@ -0,0 +1,114 @@
+import collections
+
+"""
+RTT sparklines for the device tables in nms.py.
+
+A Treeview cannot draw charts, but every item can show an image in its tree
+column. SparklineCache keeps one small PhotoImage per device and repaints it
+in place when the device has a new RTT sample, so the row itself does not
+need to change. Only rows the table actually shows ask for an image, and at
+most RENDERS_PER_FRAME images are redrawn per frame; the rest are queued for
+the next frame so the refresh loop keeps its budget. PIL is imported on the
+first draw, so it costs nothing while sparklines are off.
+"""
+
+SPARKLINE_SAMPLES = 30  # RTT samples kept per device
+SPARKLINE_SIZE = (60, 18)  # width, height in pixels
+RENDERS_PER_FRAME = 200
+CACHE_SIZE = 2000  # images kept for devices that are not on screen
+LINE_COLOUR = (0, 128, 0, 255)
+LOSS_COLOUR = (200, 0, 0, 255)
+
+
+def draw_sparkline(samples, size=SPARKLINE_SIZE):
+    # samples are RTTs in milliseconds, None for a probe without reply; newest on the right
+    from PIL import Image, ImageDraw
+
+    width, height = size
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    rtts = [rtt for rtt in samples if rtt is not None]
+    low = min(rtts) if rtts else 0.0
+    span = (max(rtts) - low) if rtts else 0.0
+    step = (width - 1) / (SPARKLINE_SAMPLES - 1)
+    start = SPARKLINE_SAMPLES - len(samples)
+
+    segment = []
+    for index, rtt in enumerate(samples):
+        x = (start + index) * step
+        if rtt is None:
+            draw.line([(x, 0), (x, height - 1)], fill=LOSS_COLOUR)
+            if len(segment) > 1:
+                draw.line(segment, fill=LINE_COLOUR)
+            segment = []
+            continue
+        y = height - 2 - ((rtt - low) / span * (height - 4) if span else (height - 4) / 2)
+        segment.append((x, y))
+    if len(segment) > 1:
+        draw.line(segment, fill=LINE_COLOUR)
+    elif segment:
+        draw.point(segment, fill=LINE_COLOUR)
+    return image
+
+
+class SparklineCache:
+    def __init__(self, capacity=CACHE_SIZE, renders_per_frame=RENDERS_PER_FRAME):
+        self.capacity = capacity
+        self.renders_per_frame = renders_per_frame
+        self.images = collections.OrderedDict()  # device -> [PhotoImage, sample count drawn], oldest first
+        self.pending = set()  # devices whose redraw did not fit in this frame
+        self.renders = 0
+
+    def start_frame(self):
+        # Returns the devices left over from the last frame, to be refreshed again
+        self.renders = 0
+        pending, self.pending = self.pending, set()
+        return pending
+
+    def image(self, device):
+        # Image for the device's row, or "" while it has no samples. The engine appends
+        # to rtt_history on its own thread, so only the immutable snapshot is read here.
+        samples, history = device.history
+        if not history:
+            return ""
+        entry = self.images.get(device)
+        if entry is not None:
+            self.images.move_to_end(device)
+            if entry[1] == samples:
+                return entry[0]
+        if self.renders >= self.renders_per_frame:
+            self.pending.add(device)
+            return entry[0] if entry is not None else ""
+
+        self.renders += 1
+        picture = draw_sparkline(history)
+        if entry is not None:
+            entry[0].paste(picture)  # same Tk image, so the row needs no update
+            entry[1] = samples
+            return entry[0]
+        from PIL import ImageTk
+
+        photo = ImageTk.PhotoImage(picture)
+        self.images[device] = [photo, samples]
+        self.evict()
+        return photo
+
+    def evict(self):
+        # Drop the least recently used images, but never one a row still displays
+        excess = len(self.images) - self.capacity
+        if excess <= 0:
+            return
+        for device in list(self.images):
+            if excess <= 0:
+                break
+            if device.table is None or not device.table.shows(device):
+                del self.images[device]
+                excess -= 1
+
+    def discard(self, device):
+        self.images.pop(device, None)
+        self.pending.discard(device)
+
+    def clear(self):
+        self.images.clear()
+        self.pending.clear()